@@ -1,63 +1,138 @@
+import asyncio
 import random
+import time
+
+import numpy as np
 
 from sc2 import maps
 from sc2.bot_ai import BotAI
-from sc2.data import Race, Difficulty
+from sc2.data import Race, Difficulty, race_townhalls
 from sc2.ids.ability_id import AbilityId
 from sc2.ids.unit_typeid import UnitTypeId
 from sc2.ids.upgrade_id import UpgradeId
 from sc2.main import run_game
 from sc2.player import Bot, Computer
 
+from base_registry import BaseRegistry
+from combat_sim import CombatSimulator
+from command_filter import CommandFilter
+from enemy_memory import EnemyMemory
+from flow_field import FlowFields
+from influence_map import InfluenceMap
+from layout_planner import LayoutPlanner
+from map_analysis import MapAnalysis
+from profiler import Profiler
+from query_batch import QueryCollector
+from saturation import WorkerSaturation
+from scheduler import TickScheduler
+from siege_tank_micro import SiegeTankMicro
+from snapshot import READY, StateSnapshot
+from spatial_index import SpatialIndex
+from squads import SquadManager
+from target_assignment import TargetAssigner
+from telemetry import TelemetryRecorder
+from unit_registry import UnitRegistry
+
 
 class StarCraftBot(BotAI):
-    def __init__(self):
+    def __init__(self, profile_dir=None, telemetry_dir=None):
         super().__init__()
 
+        # Per-manager profiling and per-step telemetry, only active when an output directory is given
+        self.profiler = Profiler(profile_dir)
+        self.profiler.instrument(self)
+        self.telemetry = TelemetryRecorder(self, telemetry_dir)
+
         self.last_expansion_attempt = -999
         self.EXPANSION_LIMIT = 3  # Max number of expansions
         self.MINERALS_FOR_EXPANSION = 100  # Amount of minerals to be saved for expansion
         self.EXPANSION_COOLDOWN = 150  # Cooldown (game steps) between expansions to avoid over-expanding
         self.INITIAL_SCOUT_SENT = False
         self.rally_point = None
+        self.tank_micro = SiegeTankMicro(self)
+        self.command_filter = CommandFilter()
+        self.combat_sim = CombatSimulator()
+        self.enemy_memory = EnemyMemory(self)
+        self.influence = InfluenceMap(self)
+        self.flow_fields = FlowFields(self)  # Shared ground routes for army movement
+        self.squads = SquadManager(self)  # Army clustered into squads that take orders together
+        self.targeting = TargetAssigner(self)  # Focus fire and medivac pairing for engagements
+        self.map_analysis = None  # Loaded from the per-map cache when the game starts
+        self.layout = LayoutPlanner(self)
+        self.bases = BaseRegistry(self)
+        self.registry = UnitRegistry(self)  # Our units by type and role, kept current from unit events
+        self.snapshot = StateSnapshot(self)  # Columnar copy of the step's units, taken before the managers run
+        self.saturation = WorkerSaturation(self)  # Worker assignments to mineral patches and refineries
+        self.queries = QueryCollector(self)  # Answers concurrent managers' server queries in shared rounds
+
+        # Managers run through a budgeted scheduler: priority, preferred cadence (steps) and an initial cost guess
+        self.scheduler = TickScheduler(self)
+        self.scheduler.register(self.manage_army_micro, priority=100, start_minute=1, critical=True)
+        self.scheduler.register(self.manage_economy, priority=90, cost=0.004, peaceful_only=True)
+        self.scheduler.register(self.build_offensive_force, priority=80, start_minute=1)
+        self.scheduler.register(self.attacking_strategy, priority=70, start_minute=1, peaceful_only=True)
+        self.scheduler.register(self.manage_army, priority=60, cost=0.004, start_minute=1, peaceful_only=True)
+        self.scheduler.register(self.scouting_strategy, priority=50)
+        self.scheduler.register(self.update_rally_point, priority=40, cadence=500, start_minute=1,
+                                peaceful_only=True)
+        self.scheduler.register(self.regroup_at_rally_point, priority=30, start_minute=1, peaceful_only=True)
+        self.scheduler.register(self.refresh_bases, priority=20, cadence=100)
+        self.scheduler.register(self.continuous_scouting, priority=10, cadence=3000, start_minute=1,
+                                peaceful_only=True)
+
+        # Spatial indices, rebuilt at the start of every step
+        self.own_units_index = None
+        self.enemy_units_index = None
+        self.structures_index = None
+        self.mineral_field_index = None
+        self.vespene_geyser_index = None
 
     async def on_step(self, iteration: int):
-        if iteration % 100 == 0:
-            await self.check_and_relocate_workers()
-
-        await self.scouting_strategy()
-
-        if self.minutes_passed < 1:
-            await self.manage_economy()
-        else:
-            # Try to defend if under attack, otherwise proceed with normal strategy
-            if not await self.defend():
-                # Regular strategy execution
-                await self.manage_economy()
-                await self.manage_army()
-                await self.attacking_strategy()
-                # Continuous scouting
-                if iteration % 3000 == 0:
-                    await self.continuous_scouting()
-                # Update rally point periodically or when necessary
-                if iteration % 500 == 0 or not self.rally_point:
-                    self.rally_point = self.choose_rally_point()
-                # Regroup idle military units at the rally point
-                await self.regroup_at_rally_point()
-
-            await self.build_offensive_force()
-            await self.manage_army_micro()
+        self.scheduler.start_step()
+        self.snapshot.update()
+        self.build_spatial_indices()
+        self.enemy_memory.update()
+        self.influence.update()
+        self.flow_fields.update()
+        self.squads.update()
+
+        # Defence always runs first; while it is active the peaceful-only managers are skipped
+        under_threat = False
+        if self.minutes_passed >= 1:
+            under_threat = await self.run_manager(self.defend)
+
+        await self.scheduler.run_step(iteration, under_threat)
+
+        # Drop orders the units already have before they are sent to the server
+        self.command_filter.filter_actions(self.actions, self.state.game_loop)
+        self.telemetry.record(time.perf_counter() - self.scheduler.step_start)
+
+    # Run a manager coroutine, attributing the actions it issues to it
+    async def run_manager(self, manager, *args):
+        self.command_filter.mark(manager.__name__, len(self.actions))
+        return await manager(*args)
+
+    # Index own units, enemy units, structures and resources once so every proximity query is sub-linear
+    def build_spatial_indices(self):
+        snapshot = self.snapshot
+        self.own_units_index = SpatialIndex(snapshot.units.units, self, snapshot.units.positions)
+        self.enemy_units_index = SpatialIndex(snapshot.enemy_units.units, self, snapshot.enemy_units.positions)
+        self.structures_index = SpatialIndex(snapshot.structures.units, self, snapshot.structures.positions)
+        self.mineral_field_index = SpatialIndex(snapshot.mineral_field.units, self, snapshot.mineral_field.positions)
+        self.vespene_geyser_index = SpatialIndex(snapshot.vespene_geyser.units, self,
+                                                 snapshot.vespene_geyser.positions)
 
     # Method to manage economic development such as building workers and expanding
     async def manage_economy(self):
-        await self.distribute_workers()
+        self.saturation.update()
         await self.build_workers()
-        await self.manage_expansion()
         if self.minutes_passed > 1:
-            await self.build_supply_depots()
-            await self.build_refinery()
-            await self.build_engineering_bay()
+            # Run concurrently so their placement queries share one round trip
+            await asyncio.gather(self.manage_expansion(), self.build_supply_depots(), self.build_refinery(),
+                                 self.build_engineering_bay())
             await self.build_techlab()
+        else:
+            await self.manage_expansion()
 
     # Method to manage army building and tech progression
     async def manage_army(self):
@@ -68,11 +143,8 @@ class StarCraftBot(BotAI):
     # Method to manage attacks and army movement
     async def attacking_strategy(self):
         # Gather offensive units
-        army_units = self.units.filter(
-            lambda unit: unit.type_id in {UnitTypeId.MARINE, UnitTypeId.MARAUDER, UnitTypeId.REAPER,
-                                          UnitTypeId.SIEGETANK, UnitTypeId.SIEGETANKSIEGED}
-        )
-        medivacs = self.units(UnitTypeId.MEDIVAC)
+        army_units = self.registry.role("army")
+        medivacs = self.registry.units(UnitTypeId.MEDIVAC)
 
         # Check army size to see if it's time to attack
         attack_force_size = 20 if self.minutes_passed < 10 else 32
@@ -84,43 +156,46 @@ class StarCraftBot(BotAI):
             await self.decide_attack_or_retreat(target, army_units, medivacs)
 
     async def decide_attack_or_retreat(self, target, army_units, medivacs):
-        # Calculate our strength and the enemy's strength
-        our_strength = self.calculate_army_strength(army_units)
-        enemy_strength = self.calculate_enemy_strength(target)
-
-        # If our strength is significantly higher, continue the attack
-        if our_strength > enemy_strength * 1.2:
-            for unit in army_units:
-                unit.attack(target)
+        # Simulate the fight against everything that can shoot back around the target
+        enemies = self.enemies_near(target, 15)
+        prediction = self.combat_sim.predict(army_units, enemies)
+
+        # Attack if we are predicted to win, or if nothing defends the target
+        if not enemies or prediction.winner == "us":
+            self.telemetry.decide("attack")
+            # Units already in a fight focus fire, the rest keep moving with their squad
+            engaged = self.targeting.engage(army_units, self.enemy_units)
+            self.squads.order(target, attack=True, skip=engaged)
+            healing = self.targeting.heal(medivacs, army_units)
+            front = army_units.closest_to(target)
             for medivac in medivacs:
-                medivac.move(army_units.closest_to(target))
-        # If the enemy is stronger, retreat to a safe location
-        elif our_strength < enemy_strength:
-            safe_location = self.start_location
-            for unit in army_units:
-                unit.move(safe_location)
+                if medivac.tag not in healing:
+                    medivac.move(front)
+        # If the enemy is predicted to win, retreat to a safe location along a route that avoids their threat
+        elif prediction.winner == "enemy":
+            self.telemetry.decide("retreat")
+            safe_location = self.influence.safest_cell_near(self.start_location, 15)
+            self.squads.order(safe_location, avoid_threat=True)
             for medivac in medivacs:
                 medivac.move(safe_location)
 
-    def calculate_army_strength(self, army_units):
-        # A simple calculation based on unit types and their health
-        strength = 0
-        for unit in army_units:
-            strength += unit.health + unit.shield
-        return strength
-
-    def calculate_enemy_strength(self, target):
-        # A simple calculation based on visible enemy units near the target
-        enemy_units = self.enemy_units.closer_than(15, target)
-        strength = 0
-        for enemy in enemy_units:
-            strength += enemy.health + enemy.shield
-        return strength
+    # Enemy units plus armed enemy structures (cannons, spines, turrets...) near a position
+    def enemies_near(self, position, distance):
+        enemies = self.enemy_units_index.closer_than(distance, position)
+        defenses = self.enemy_structures.filter(lambda structure: structure.can_attack)
+        if defenses:
+            enemies.extend(defenses.closer_than(distance, position))
+        return enemies
 
     def find_target(self):
-        # Check for visible enemy units or structures
-        if self.enemy_units:
-            return random.choice(self.enemy_units).position
+        # Go for the biggest enemy army we know of, even if it has left vision
+        army_position, _ = self.enemy_memory.largest_army_cluster()
+        if army_position:
+            return army_position
+        # Otherwise the most recently discovered expansion, then any visible structure
+        expansion = self.enemy_memory.newest_expansion()
+        if expansion:
+            return expansion
         if self.enemy_structures:
             return random.choice(self.enemy_structures).position
 
@@ -163,13 +238,15 @@ class StarCraftBot(BotAI):
 
     async def use_scanning_abilities(self):
         # Use Orbital Command's Scanner Sweep to gain vision if we have enough energy
-        if self.units(UnitTypeId.ORBITALCOMMAND).exists:
-            for oc in self.units(UnitTypeId.ORBITALCOMMAND).filter(lambda x: x.energy >= 50):
-                # Find a priority target for scanning, such as enemy army or hidden expansions
-                scan_target = random.choice(self.enemy_start_locations)
+        if self.registry.count(UnitTypeId.ORBITALCOMMAND, ready=True):
+            structures = self.snapshot.structures
+            charged = structures.mask({UnitTypeId.ORBITALCOMMAND}, READY) & (structures.rows["energy"] >= 50)
+            oc = structures.first(charged)
+            if oc:
+                # Scan where the most enemy value was last seen, falling back to the enemy start location
+                scan_target = self.enemy_memory.best_scan_target() or random.choice(self.enemy_start_locations)
                 if scan_target:
                     oc(AbilityId.SCAN_MOVE, scan_target)
-                    break
 
     # SCV production across all command centers
     async def build_workers(self):
@@ -185,88 +262,66 @@ class StarCraftBot(BotAI):
     # Ensure we are not supply capped by building supply depots
     async def build_supply_depots(self):
         if self.supply_left < 10 and not self.already_pending(UnitTypeId.SUPPLYDEPOT):
-            ccs = self.townhalls.ready
-            if ccs.exists and self.can_afford(UnitTypeId.SUPPLYDEPOT):
-                await self.build_building_near(UnitTypeId.SUPPLYDEPOT, random.choice(ccs).position)
+            if self.townhalls.ready.exists and self.can_afford(UnitTypeId.SUPPLYDEPOT):
+                await self.build_building_near(UnitTypeId.SUPPLYDEPOT, self.start_location.position)
 
     # Logic for expanding to a new base
     async def manage_expansion(self):
         if self.townhalls.ready.amount < self.EXPANSION_LIMIT:
             # Fast first expansion regardless of cooldown
             if self.townhalls.ready.amount == 1 and self.minerals > self.MINERALS_FOR_EXPANSION:
-                location = await self.get_next_expansion()
+                location = self.next_expansion()
                 if location:
-                    err = await self.expand_now()
-                    if not err:
-                        self.last_expansion_attempt = self.time
+                    await self.expand_to(location)
+                    self.last_expansion_attempt = self.time
 
             # Check if we're not on cooldown from the last attempted expansion
             elif self.time - self.last_expansion_attempt > self.EXPANSION_COOLDOWN:
                 # Check if we have saved enough minerals for an expansion
                 if self.minerals > self.MINERALS_FOR_EXPANSION:
                     # Find the location for the next expansion
-                    location = await self.get_next_expansion()
-                    # Ensure that there are no nearby enemies before trying to expand
-                    if location and not self.enemy_units.closer_than(10, location).exists:
-                        err = await self.expand_now()
-                        if not err:
-                            self.last_expansion_attempt = self.time
-
-    async def check_and_relocate_workers(self):
-        for cc in self.townhalls.ready:
-            # Are there still resources close to this Command Center to gather from?
-            minerals_close = self.mineral_field.closer_than(10, cc)
-            geysers_close = self.vespene_geyser.closer_than(10, cc)
-            if minerals_close and geysers_close:
-                # There are still resources around, no need for relocation
-                continue
+                    location = self.next_expansion()
+                    # Ensure that no enemy threatens the location before trying to expand
+                    if location and self.influence.is_safe(location):
+                        await self.expand_to(location)
+                        self.last_expansion_attempt = self.time
+
+    # Start a command center at the expansion location, or as close to it as it fits
+    async def expand_to(self, location):
+        if not self.can_afford(UnitTypeId.COMMANDCENTER):
+            return False
+        position = await self.queries.find_placement(UnitTypeId.COMMANDCENTER, location, max_distance=10,
+                                                     placement_step=1)
+        # Concurrent managers may have spent the money while the query was out
+        worker = self.select_build_worker(position) if position and self.can_afford(
+            UnitTypeId.COMMANDCENTER) else None
+        if worker:
+            worker.build(UnitTypeId.COMMANDCENTER, position)
+            return True
+        return False
 
-            # Time to find a new mining location as current resources are depleted
-            new_location = await self.find_new_resource_location()
-            if new_location:
-                # Relocate the workers from depleted resources to the new location
-                for scv in self.workers.idle or self.workers.gathering:
-                    # Just relocate the workers that are too far from the available resources
-                    if not minerals_close and scv.is_carrying_minerals:
-                        scv.return_resource()
-                    elif not geysers_close and scv.is_carrying_vespene:
-                        scv.return_resource()
-                    else:
-                        # Otherwise, move to the new mineral patches
-                        scv.move(new_location)
-
-    async def find_new_resource_location(self):
-        # Sort expansions based on distance to current location and return the first one that is not taken
-        unoccupied_expansions = [expansion for expansion in self.expansion_locations_list if
-                                 not self.is_expansion_taken(expansion)]
-        if unoccupied_expansions:
-            return min(unoccupied_expansions, key=lambda expansion: self.start_location.distance_to(expansion))
-
-        # If no unoccupied expansions are available, then return None
+    # Closest free expansion by ground distance from the main base, from the cached map analysis instead of a
+    # pathing query per expansion
+    def next_expansion(self):
+        for location in self.map_analysis.expansions_by_distance(self.start_location):
+            if not any(townhall.distance_to(location) < self.EXPANSION_GAP_THRESHOLD for townhall in self.townhalls):
+                return location
         return None
 
-    def is_expansion_taken(self, expansion):
-        return any(cc.position.is_same_as(expansion) for cc in self.townhalls)
+    # Keep the remaining resources of our bases current for the refinery and expansion decisions; depleted
+    # patches and refineries are left to the worker saturation, which moves their workers on its own
+    async def refresh_bases(self):
+        self.bases.refresh()
 
     # Building refineries at each base to collect vespene gas
     async def build_refinery(self):
-        for cc in self.townhalls.ready:
-            # Find all Vespenes within a reasonable distance to our ready TownHalls
-            vespenes = self.vespene_geyser.closer_than(10, cc)
-            for vespene in vespenes:
-                # Check if we don't have a refinery and we're not already building a refinery here
-                if not self.gas_buildings.closer_than(1.0, vespene).exists and self.already_pending(
-                        UnitTypeId.REFINERY) == 0:
-                    if self.can_afford(UnitTypeId.REFINERY):
-                        await self.build(UnitTypeId.REFINERY, vespene)
-
-            # Make sure we don't build excess Refineries
-        if self.gas_buildings.amount < self.townhalls.ready.amount * 2:
-            for cc in self.townhalls.ready:
-                # Find the closest Vespene Geyser without an active Refinery
-                vespene = self.vespene_geyser.closest_to(cc)
-                if self.can_afford(UnitTypeId.REFINERY) and not self.gas_buildings.closer_than(1.0, vespene).exists:
-                    await self.build(UnitTypeId.REFINERY, vespene)
+        for base in self.bases.owned(ready=True):
+            # Geysers of our ready bases that have no refinery yet; one refinery is started at a time
+            for geyser_position in base.free_geysers():
+                # already_pending is cached for the step, so stop after the first refinery ourselves
+                if self.already_pending(UnitTypeId.REFINERY) == 0 and self.can_afford(UnitTypeId.REFINERY):
+                    await self.build(UnitTypeId.REFINERY, self.vespene_geyser_index.closest_to(geyser_position))
+                    return
 
     # Create and manage production buildings
     async def manage_production_buildings(self):
@@ -275,12 +330,12 @@ class StarCraftBot(BotAI):
         max_starports = 2 if self.minutes_passed < 15 else 4
         max_armories = 1
 
-        if self.structures(UnitTypeId.SUPPLYDEPOT).ready.exists:
+        if self.registry.count(UnitTypeId.SUPPLYDEPOT, ready=True):
             # Create production buildings based on requirements for your chosen army composition
-            barracks_count = self.structures(UnitTypeId.BARRACKS).amount + self.already_pending(UnitTypeId.BARRACKS)
-            factory_count = self.structures(UnitTypeId.FACTORY).amount + self.already_pending(UnitTypeId.FACTORY)
-            starport_count = self.structures(UnitTypeId.STARPORT).amount + self.already_pending(UnitTypeId.STARPORT)
-            armory_count = self.structures(UnitTypeId.ARMORY).amount + self.already_pending(UnitTypeId.ARMORY)
+            barracks_count = self.registry.total(UnitTypeId.BARRACKS)
+            factory_count = self.registry.total(UnitTypeId.FACTORY)
+            starport_count = self.registry.total(UnitTypeId.STARPORT)
+            armory_count = self.registry.total(UnitTypeId.ARMORY)
 
             # Requirements for building production structures
             need_more_barracks = self.can_afford(UnitTypeId.BARRACKS) and barracks_count < max_barracks
@@ -290,18 +345,22 @@ class StarCraftBot(BotAI):
             # Build Armory after the first Factory
             need_armory = self.can_afford(UnitTypeId.ARMORY) and armory_count < max_armories and factory_count > 0
 
-            # Logic to build Barracks, Factories, Starports, and an Armory
+            # Logic to build Barracks, Factories, Starports, and an Armory; started together so any placement
+            # queries are answered in one round
+            builds = []
             if need_more_barracks:
-                await self.build_building_near(UnitTypeId.BARRACKS, self.start_location.position)
+                builds.append(self.build_building_near(UnitTypeId.BARRACKS, self.start_location.position))
 
             if need_more_factories and barracks_count > 0:  # Ensure we have a Barracks before building a Factory
-                await self.build_building_near(UnitTypeId.FACTORY, self.start_location.position)
+                builds.append(self.build_building_near(UnitTypeId.FACTORY, self.start_location.position))
 
             if need_more_starports and factory_count > 0:  # Ensure we have a Factory before building a Starport
-                await self.build_building_near(UnitTypeId.STARPORT, self.start_location.position)
+                builds.append(self.build_building_near(UnitTypeId.STARPORT, self.start_location.position))
 
             if need_armory:
-                await self.build_building_near(UnitTypeId.ARMORY, self.start_location.position)
+                builds.append(self.build_building_near(UnitTypeId.ARMORY, self.start_location.position))
+
+            await asyncio.gather(*builds)
 
     # Produce combat units from available barracks
     async def build_offensive_force(self):
@@ -314,60 +373,60 @@ class StarCraftBot(BotAI):
         siege_tank_count_target = 2 if self.minutes_passed < 15 else 8
 
         # Check if we have the required buildings before training units
-        barracks_ready = self.structures(UnitTypeId.BARRACKS).ready.exists
-        factory_ready = self.structures(UnitTypeId.FACTORY).ready.exists
-        starport_ready = self.structures(UnitTypeId.STARPORT).ready.exists
+        barracks_ready = self.registry.count(UnitTypeId.BARRACKS, ready=True)
+        factory_ready = self.registry.count(UnitTypeId.FACTORY, ready=True)
+        starport_ready = self.registry.count(UnitTypeId.STARPORT, ready=True)
 
         # Adjust unit production based on scouting information and current needs
         if barracks_ready:
-            for rax in self.structures(UnitTypeId.BARRACKS).ready.idle:
-                if self.can_afford(UnitTypeId.MARINE) and self.units(UnitTypeId.MARINE).amount + self.already_pending(
+            for rax in self.registry.ready(UnitTypeId.BARRACKS).idle:
+                if self.can_afford(UnitTypeId.MARINE) and self.registry.total(
                         UnitTypeId.MARINE) < marine_count_target:
                     rax.train(UnitTypeId.MARINE)
 
                 # Include a check to see if a Tech Lab is attached for Marauders and if we've hit our target count
-                elif self.can_afford(UnitTypeId.MARAUDER) and rax.has_add_on and self.units(
-                        UnitTypeId.MARAUDER).amount + self.already_pending(UnitTypeId.MARAUDER) < marauder_count_target:
+                elif self.can_afford(UnitTypeId.MARAUDER) and rax.has_add_on and self.registry.total(
+                        UnitTypeId.MARAUDER) < marauder_count_target:
                     rax.train(UnitTypeId.MARAUDER)
 
                 # Reaper training prioritized early game for harassment
-                if self.can_afford(UnitTypeId.REAPER) and self.units(UnitTypeId.REAPER).amount + self.already_pending(
+                if self.can_afford(UnitTypeId.REAPER) and self.registry.total(
                         UnitTypeId.REAPER) < reaper_count_target:
                     rax.train(UnitTypeId.REAPER)
 
         # Factory for Siege Tanks
         if factory_ready:
-            for factory in self.structures(UnitTypeId.FACTORY).ready.idle:
-                if self.units(UnitTypeId.SIEGETANK).amount < siege_tank_count_target and self.can_afford(
+            for factory in self.registry.ready(UnitTypeId.FACTORY).idle:
+                if self.registry.count(UnitTypeId.SIEGETANK) < siege_tank_count_target and self.can_afford(
                         UnitTypeId.SIEGETANK):
                     factory.train(UnitTypeId.SIEGETANK)
 
         # Starport for Medivacs and Banshees
         if starport_ready:
-            for starport in self.structures(UnitTypeId.STARPORT).ready.idle:
-                if self.units(UnitTypeId.MEDIVAC).amount < medivac_count_target and self.can_afford(UnitTypeId.MEDIVAC):
+            for starport in self.registry.ready(UnitTypeId.STARPORT).idle:
+                if self.registry.count(UnitTypeId.MEDIVAC) < medivac_count_target and self.can_afford(UnitTypeId.MEDIVAC):
                     starport.train(UnitTypeId.MEDIVAC)
                 # Check if techlab is attached for Banshee production
-                if starport.has_add_on and self.can_afford(UnitTypeId.BANSHEE) and self.units(
-                        UnitTypeId.BANSHEE).amount < banshee_count_target:
+                if starport.has_add_on and self.can_afford(UnitTypeId.BANSHEE) and self.registry.count(
+                        UnitTypeId.BANSHEE) < banshee_count_target:
                     starport.train(UnitTypeId.BANSHEE)
 
     # Engineering bay for upgrade research
     async def upgrade_units(self):
         # Check if we have an Engineering Bay for infantry upgrades
-        if self.structures(UnitTypeId.ENGINEERINGBAY).ready.exists:
+        if self.registry.count(UnitTypeId.ENGINEERINGBAY, ready=True):
             await self.research_infantry_upgrades()
 
         # Check if we have a Barracks with a Tech Lab for infantry upgrades
-        if self.structures(UnitTypeId.BARRACKSTECHLAB).ready.exists:
+        if self.registry.count(UnitTypeId.BARRACKSTECHLAB, ready=True):
             await self.research_barracks_upgrades()
 
         # Check if we have an Armory for vehicle and ship upgrades
-        if self.structures(UnitTypeId.ARMORY).ready.exists:
+        if self.registry.count(UnitTypeId.ARMORY, ready=True):
             await self.research_armory_upgrades()
 
     async def research_infantry_upgrades(self):
-        engineering_bay = self.structures(UnitTypeId.ENGINEERINGBAY).ready.first
+        engineering_bay = self.registry.ready(UnitTypeId.ENGINEERINGBAY).first
 
         # Research infantry weapons and armor upgrades
         if not self.already_pending_upgrade(UpgradeId.TERRANINFANTRYWEAPONSLEVEL1) and self.can_afford(
@@ -379,7 +438,7 @@ class StarCraftBot(BotAI):
             engineering_bay.research(UpgradeId.TERRANINFANTRYARMORSLEVEL1)
 
     async def research_barracks_upgrades(self):
-        tech_lab = self.structures(UnitTypeId.BARRACKSTECHLAB).ready.first
+        tech_lab = self.registry.ready(UnitTypeId.BARRACKSTECHLAB).first
 
         # Research Stimpack and Combat Shield
         if not self.already_pending_upgrade(UpgradeId.STIMPACK) and self.can_afford(UpgradeId.STIMPACK):
@@ -389,7 +448,7 @@ class StarCraftBot(BotAI):
             tech_lab.research(UpgradeId.SHIELDWALL)
 
     async def research_armory_upgrades(self):
-        armory = self.structures(UnitTypeId.ARMORY).ready.first
+        armory = self.registry.ready(UnitTypeId.ARMORY).first
 
         # Research vehicle and ship plating and weapons upgrades
         if not self.already_pending_upgrade(UpgradeId.TERRANVEHICLEANDSHIPARMORSLEVEL1) and self.can_afford(
@@ -405,7 +464,7 @@ class StarCraftBot(BotAI):
         if not self.already_pending_upgrade(upgrade_id) and self.can_afford(upgrade_id):
             # Check if a required structure type is needed before researching (e.g. Armory for higher levels)
             if required_structure_type:
-                required_structure = self.structures(required_structure_type).ready
+                required_structure = self.registry.ready(required_structure_type)
                 if not required_structure.exists:
                     # Required structure not available, cannot research this upgrade yet
                     return
@@ -414,13 +473,13 @@ class StarCraftBot(BotAI):
 
     async def upgrade_structures(self):
         # Engineering Bay upgrades for structures
-        if self.structures(UnitTypeId.ENGINEERINGBAY).ready.exists:
-            eb = self.structures(UnitTypeId.ENGINEERINGBAY).ready.first
+        if self.registry.count(UnitTypeId.ENGINEERINGBAY, ready=True):
+            eb = self.registry.ready(UnitTypeId.ENGINEERINGBAY).first
             await self.research_upgrade(UpgradeId.HISECAUTOTRACKING, eb)
             await self.research_upgrade(UpgradeId.TERRANBUILDINGARMOR, eb)
 
         # Command Center upgrades to Orbital Command or Planetary Fortress
-        for cc in self.townhalls(UnitTypeId.COMMANDCENTER).idle:
+        for cc in self.registry.units(UnitTypeId.COMMANDCENTER).idle:
             # If the required upgrades are finished or not necessary, consider upgrading to Orbital Command or
             # Planetary Fortress
             if self.can_afford(UnitTypeId.ORBITALCOMMAND) and not cc.has_add_on:
@@ -434,108 +493,178 @@ class StarCraftBot(BotAI):
         # Check if we have enough resources to build a Tech Lab
         if self.can_afford(UnitTypeId.BARRACKSTECHLAB):
             # Iterate through all Barracks without a Tech Lab
-            for rax in self.structures(UnitTypeId.BARRACKS).ready:
+            for rax in self.registry.ready(UnitTypeId.BARRACKS):
                 if not rax.has_add_on:
                     # Attach a Tech Lab to the Barracks
                     rax.build(UnitTypeId.BARRACKSTECHLAB)
 
         # Similarly, build Tech Labs for Factories and Starports if needed
         if self.can_afford(UnitTypeId.FACTORYTECHLAB):
-            for factory in self.structures(UnitTypeId.FACTORY).ready:
+            for factory in self.registry.ready(UnitTypeId.FACTORY):
                 if not factory.has_add_on:
                     factory.build(UnitTypeId.FACTORYTECHLAB)
 
         if self.can_afford(UnitTypeId.STARPORTTECHLAB):
-            for starport in self.structures(UnitTypeId.STARPORT).ready:
+            for starport in self.registry.ready(UnitTypeId.STARPORT):
                 if not starport.has_add_on:
                     starport.build(UnitTypeId.STARPORTTECHLAB)
 
-    # Use established position logic to prevent unit pathing blockage
+    # Take the next reserved slot of the layout planner, only searching with placement queries once the base has run
+    # out of slots
     async def build_building_near(self, building_type, position, max_distance=30):
+        if not self.can_afford(building_type):
+            return False
         try:
-            location = await self.find_placement(building_type, position, max_distance=max_distance)
-            if location:
-                await self.build(building_type, location)
+            location = await self.layout.take(building_type, position)
+            if location is None:
+                location = await self.queries.find_placement(building_type, position, max_distance=max_distance)
+            # Concurrent managers may have spent the money while the query was out
+            worker = self.select_build_worker(location) if location and self.can_afford(building_type) else None
+            if worker:
+                worker.build(building_type, location)
                 return True  # Successfully found a location and issued a build command
+            if location:
+                self.layout.release(location)
         except Exception as e:
             print(str(e))
         return False  # Failed to find a location/build the structure
 
     async def build_engineering_bay(self):
         # Check if you already have an ENGINEERINGBAY
-        if not self.structures(UnitTypeId.ENGINEERINGBAY).exists:
+        if not self.registry.count(UnitTypeId.ENGINEERINGBAY):
             # Ensure you have enough resources before trying to build
             if self.can_afford(UnitTypeId.ENGINEERINGBAY):
                 await self.build_building_near(UnitTypeId.ENGINEERINGBAY, self.start_location.position)
 
     #  defense strategy
     async def defend(self):
-        for unit in self.units:
-            if self.enemy_units.closer_than(15, unit.position).exists:
-                defensive_squad = self.units.filter(
-                    lambda unit: unit.type_id in {UnitTypeId.MARINE, UnitTypeId.MARAUDER, UnitTypeId.REAPER,
-                                                  UnitTypeId.SIEGETANK, UnitTypeId.SIEGETANKSIEGED})
-                await self.defend_location(unit, self.enemy_units, defensive_squad)
-                return True
-
-        for th in self.townhalls:
-            enemies = self.enemy_units.closer_than(15, th.position)
-            # Check if there are enemy units and if we have enough units to defend
-            if enemies.exists:
-                defensive_squad = self.units.filter(
-                    lambda unit: unit.type_id in {UnitTypeId.MARINE, UnitTypeId.MARAUDER, UnitTypeId.REAPER,
-                                                  UnitTypeId.SIEGETANK, UnitTypeId.SIEGETANKSIEGED})
-
-                await self.defend_location(th, enemies, defensive_squad)
-                return True
+        # One batched nearest-enemy query for all of our units instead of a scan per unit
+        index = self.enemy_units_index.first_within(15, self.own_units_index.positions)
+        if index is not None:
+            unit = self.own_units_index.unit_at(index)
+            defensive_squad = self.registry.role("army")
+            await self.defend_location(unit, self.enemy_units, defensive_squad)
+            return True
+
+        # The same batched query for our townhalls
+        structures = self.snapshot.structures
+        townhalls = structures.mask(race_townhalls[self.race])
+        index = self.enemy_units_index.first_within(15, structures.positions[townhalls])
+        if index is not None:
+            th = structures.units[np.flatnonzero(townhalls)[index]]
+            enemies = self.enemy_units_index.closer_than(15, th.position)
+            defensive_squad = self.registry.role("army")
+            await self.defend_location(th, enemies, defensive_squad)
+            return True
         return False
 
     # micro-management for army units
     async def manage_army_micro(self):
-        for tank in self.units(UnitTypeId.SIEGETANK):
-            await self.siege_tank_micro(tank)
-
-        for tank in self.units(UnitTypeId.SIEGETANKSIEGED):
-            await self.siege_tank_micro(tank)
-
-    async def siege_tank_micro(self, tank):
-        if self.enemy_units.in_attack_range_of(tank) or self.enemy_structures.in_attack_range_of(tank):
-            tank(AbilityId.SIEGEMODE_SIEGEMODE)
-
-        if not self.enemy_units.in_attack_range_of(tank) and not self.enemy_structures.in_attack_range_of(tank):
-            tank(AbilityId.UNSIEGE_UNSIEGE)
+        # All tanks are evaluated against all enemies in one batch; mode changes are only sent on transitions
+        self.tank_micro.step()
 
     async def defend_location(self, location, enemies, defensive_squad):
         if defensive_squad.amount > 5:
             # Get Medivacs from the defensive squad
-            medivacs = self.units(UnitTypeId.MEDIVAC)
+            medivacs = self.registry.units(UnitTypeId.MEDIVAC)
 
             # Use the rest of the defensive squad to engage the enemy
             if enemies.exists:
-                for unit in defensive_squad:
-                    unit.attack(enemies.closest_to(location))
+                # Fall back to the main base instead of feeding units into a fight we would lose, unless the
+                # attacked location is a structure that has to be held
+                nearby_enemies = enemies.closer_than(15, location) or enemies
+                prediction = self.combat_sim.predict(defensive_squad, nearby_enemies)
+                if prediction.winner == "enemy" and not getattr(location, "is_structure", False):
+                    self.telemetry.decide("fall_back")
+                    safe_location = self.influence.safest_cell_near(self.start_location, 15)
+                    self.squads.order(safe_location, avoid_threat=True)
+                    for medivac in medivacs:
+                        medivac.move(safe_location)
+                    return
+
+                self.telemetry.decide("defend")
+                # Units in reach of the enemy focus fire, the others close in on the enemy nearest the location
+                engaged = self.targeting.engage(defensive_squad, enemies)
+                target = enemies.closest_to(location)
+                self.squads.order(target.position, attack=True, skip=engaged)
 
-                # Medivacs should follow and heal the combat units
+                # Medivacs heal the injured, or follow the squad closest to them
+                healing = self.targeting.heal(medivacs, defensive_squad)
                 for medivac in medivacs:
-                    # Find the closest ground unit that the Medivac can follow and heal
-                    if defensive_squad.exists:  # Make sure there are units to follow
-                        closest_combat_unit = defensive_squad.closest_to(medivac)
-                        medivac.move(closest_combat_unit)
+                    squad = self.squads.closest_to(medivac.position)
+                    if squad and medivac.tag not in healing:
+                        medivac.move(squad.leader)
+
+    async def update_rally_point(self):
+        self.rally_point = self.choose_rally_point()
 
     def choose_rally_point(self):
+        # Stage behind the most contested part of the front if there is one
+        frontier = self.influence.weakest_frontier()
+        if frontier:
+            return self.influence.safest_cell_near(frontier, 10)
+        # Otherwise a short way along the ground route towards the enemy
         if self.enemy_start_locations:
-            rally_point = self.start_location.towards(self.enemy_start_locations[0], distance=20)
+            rally_point = self.flow_fields.along(self.start_location, self.enemy_start_locations[0], 20)
         else:
-            rally_point = self.start_location.towards(self.game_info.map_center, distance=20)
-        return rally_point
+            rally_point = self.flow_fields.along(self.start_location, self.game_info.map_center, 20)
+        return self.influence.safest_cell_near(rally_point, 10)
 
     async def regroup_at_rally_point(self):
         # Regroup idle military units at the rally point
         if self.rally_point:
-            for unit in self.units.idle:
-                if unit.type_id in {UnitTypeId.MARINE, UnitTypeId.MARAUDER, UnitTypeId.REAPER, UnitTypeId.SIEGETANK,
-                                    UnitTypeId.MEDIVAC, UnitTypeId.SIEGETANKSIEGED}:
-                    unit.move(self.rally_point)
+            self.squads.order(self.rally_point, idle_only=True)
+            for medivac in self.registry.role("support").idle:
+                medivac.move(self.rally_point)
+
+    # Keep the unit and base registries and the worker assignments current from unit events
+    async def on_unit_created(self, unit):
+        self.registry.add(unit)
+        self.saturation.worker_added(unit)
+
+    async def on_building_construction_started(self, unit):
+        self.registry.add(unit)
+        self.bases.structure_added(unit)
+
+    async def on_building_construction_complete(self, unit):
+        self.registry.complete(unit)
+        self.bases.structure_added(unit)
+        self.saturation.structure_changed(unit)
+
+    async def on_unit_type_changed(self, unit, previous_type):
+        self.registry.type_changed(unit)
+        if unit.is_structure:
+            self.bases.structure_added(unit)
+            self.saturation.structure_changed(unit)
+
+    async def on_unit_destroyed(self, unit_tag):
+        self.registry.remove(unit_tag)
+        self.bases.unit_destroyed(unit_tag)
+        self.saturation.unit_destroyed(unit_tag)
+
+    async def on_start(self):
+        self.profiler.instrument_client(self.client)
+        self.profiler.patch_units()
+        self.influence.setup()
+        self.flow_fields.setup()
+        self.map_analysis = MapAnalysis.load_or_build(self)
+        self.layout.setup(self.map_analysis)
+        self.bases.setup()
+        self.registry.setup()
+        self.saturation.setup()
+
+    async def on_end(self, game_result):
+        self.telemetry.close(game_result)
+        self.flow_fields.close()
+        self.profiler.dump()
+        # Report how many orders each manager sent and how many were dropped as duplicates
+        for manager, counts in self.command_filter.stats().items():
+            print(f"{manager}: sent {counts['sent']}, suppressed {counts['suppressed']}")
+        for manager, deferrals in self.scheduler.deferrals.items():
+            print(f"{manager}: deferred {deferrals} times")
+        print(f"combat simulator: {self.combat_sim.hits} cached, {self.combat_sim.misses} simulated")
+        print(f"flow fields: {self.flow_fields.hits} cached, {self.flow_fields.misses} computed")
+        print(f"worker saturation: {self.saturation.orders} gather orders")
 
     # Calculate elapsed game time minutes
     @property
@@ -543,9 +672,10 @@ class StarCraftBot(BotAI):
         return self.state.game_loop / (22.4 * 60)
 
 
-# Run the game
-run_game(
-    maps.get("sc2-ai-cup-2022"),
-    [Bot(Race.Terran, StarCraftBot()), Computer(Race.Terran, Difficulty.Hard)],
-    realtime=False,
-)
+if __name__ == "__main__":
+    # Run the game
+    run_game(
+        maps.get("sc2-ai-cup-2022"),
+        [Bot(Race.Terran, StarCraftBot()), Computer(Race.Terran, Difficulty.Hard)],
+        realtime=False,
+    )
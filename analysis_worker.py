@@ -0,0 +1,134 @@
+import multiprocessing
+import queue
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+FLOW_FIELD = "flow_field"
+
+
+# Grids shared between the game process and the worker, one row per slot
+def slot_layout(shape, slots):
+    return {
+        "pathable": (shape, np.bool_),
+        "threat": ((slots,) + shape, np.float64),  # Input: ground threat for threat weighted fields
+        "distances": ((slots,) + shape, np.float32),  # Output: distance field
+        "next_cell": ((slots, shape[0] * shape[1]), np.int32),  # Output: downhill neighbour of every cell
+    }
+
+
+def attach(blocks, shape, slots):
+    return {name: np.ndarray(layout_shape, dtype=dtype, buffer=blocks[name].buf)
+            for name, (layout_shape, dtype) in slot_layout(shape, slots).items()}
+
+
+# Worker process: computes what is asked for into the slot named by the request and answers with the slot only
+def serve(names, shape, slots, requests, responses):
+    from flow_field import PathingGraph, downhill
+
+    blocks = {name: shared_memory.SharedMemory(name=block_name) for name, block_name in names.items()}
+    grids = attach(blocks, shape, slots)
+    graph = PathingGraph(grids["pathable"].copy())
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        kind, key, slot, args = request
+        try:
+            if kind == FLOW_FIELD:
+                cell, weighted, threat_weight = args
+                threat = grids["threat"][slot] if weighted else None
+                distances = grids["distances"][slot]
+                distances[:] = graph.distances(cell, threat, threat_weight)
+                grids["next_cell"][slot] = downhill(distances)
+            responses.put((key, slot, None))
+        except Exception as e:
+            responses.put((key, slot, str(e)))
+
+
+# Runs expensive map analysis in a separate process so it neither stalls the game loop nor competes with it for
+# the interpreter. Inputs and results are grids in shared memory slots; only the request (a key and a slot number)
+# and the answer travel through the queues, so large arrays are never pickled. A request made on one step is
+# collected with poll() on a later one.
+class AnalysisWorker:
+    SLOTS = 4  # Computations in flight at once
+
+    def __init__(self, pathable):
+        self.shape = pathable.shape
+        self.blocks = {}
+        for name, (shape, dtype) in slot_layout(self.shape, self.SLOTS).items():
+            size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            self.blocks[name] = shared_memory.SharedMemory(create=True, size=size)
+        self.grids = attach(self.blocks, self.shape, self.SLOTS)
+        self.grids["pathable"][:] = pathable
+        self.free_slots = list(range(self.SLOTS))
+        self.requests = {}  # slot -> key
+
+        # The game process runs the client's threads and sockets by now, so it must not be forked. A fork server
+        # is a clean process that has the worker's modules imported already; spawn where there is none
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["analysis_worker", "flow_field"])
+        else:
+            context = multiprocessing.get_context("spawn")
+        self.request_queue = context.Queue()
+        self.response_queue = context.Queue()
+        self.process = context.Process(
+            target=serve, daemon=True,
+            args=({name: block.name for name, block in self.blocks.items()}, self.shape, self.SLOTS,
+                  self.request_queue, self.response_queue))
+        self.process.start()
+        # Shared memory outlives the process unless it is unlinked, so clean up even if close() is never called
+        self._finalizer = weakref.finalize(self, AnalysisWorker.release, self.process, self.request_queue,
+                                           self.blocks)
+
+    @property
+    def alive(self):
+        return self.process.is_alive()
+
+    # Ask for a flow field towards the cell; False if every slot is busy
+    def submit(self, key, cell, threat=None, threat_weight=0.0):
+        if not self.free_slots:
+            return False
+        slot = self.free_slots.pop()
+        if threat is not None:
+            self.grids["threat"][slot] = threat
+        self.requests[slot] = key
+        self.request_queue.put((FLOW_FIELD, key, slot, (cell, threat is not None, threat_weight)))
+        return True
+
+    # (key, (distances, next_cell)) of every finished request, (key, None) for failed ones; the grids are copied
+    # out so the slot can be reused
+    def poll(self):
+        results = []
+        while True:
+            try:
+                key, slot, error = self.response_queue.get_nowait()
+            except queue.Empty:
+                return results
+            del self.requests[slot]
+            self.free_slots.append(slot)
+            if error:
+                print(f"Analysis worker failed on {key}: {error}")
+                results.append((key, None))
+                continue
+            results.append((key, (self.grids["distances"][slot].copy(), self.grids["next_cell"][slot].copy())))
+
+    def close(self):
+        self.grids = None
+        self._finalizer()
+
+    @staticmethod
+    def release(process, request_queue, blocks):
+        if process.is_alive():
+            request_queue.put(None)
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        for block in blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                pass  # Still viewed by arrays at interpreter exit; unlinking is what frees it
+            block.unlink()
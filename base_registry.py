@@ -0,0 +1,127 @@
+from sc2.ids.unit_typeid import UnitTypeId
+
+REFINERY_TYPES = {UnitTypeId.REFINERY, UnitTypeId.REFINERYRICH}
+TOWNHALL_TYPES = {UnitTypeId.COMMANDCENTER, UnitTypeId.ORBITALCOMMAND, UnitTypeId.PLANETARYFORTRESS}
+
+
+class Base:
+    def __init__(self, location):
+        self.location = location
+        self.minerals = {}  # mineral field tag -> minerals left when last seen, None if never seen up close
+        self.geysers = {}  # geyser tag -> vespene left when last seen, None if never seen up close
+        self.geyser_positions = {}  # geyser tag -> position
+        self.refineries = {}  # geyser tag -> our refinery tag
+        self.townhall = None  # Tag of our townhall on this base
+
+    @property
+    def minerals_left(self):
+        return sum(minerals or 0 for minerals in self.minerals.values())
+
+    @property
+    def vespene_left(self):
+        return sum(vespene or 0 for vespene in self.geysers.values())
+
+    @property
+    def has_minerals(self):
+        # Patches refreshed at 0 count as mined out before their dead unit event arrives
+        return any(minerals is None or minerals > 0 for minerals in self.minerals.values())
+
+    @property
+    def has_gas(self):
+        return any(vespene is None or vespene > 0 for vespene in self.geysers.values())
+
+    # Positions of geysers that may have gas left and have no refinery of ours on them
+    def free_geysers(self):
+        return [self.geyser_positions[tag] for tag, vespene in self.geysers.items()
+                if (vespene is None or vespene > 0) and tag not in self.refineries]
+
+
+# Every expansion location with its mineral patches, geysers, refineries and our townhall. Built once at game start
+# and kept current from unit events, so depletion and refinery decisions are lookups instead of proximity scans.
+class BaseRegistry:
+    TOWNHALL_DISTANCE = 6  # A townhall this close to an expansion location belongs to it
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.bases = []
+        self.resource_bases = {}  # resource tag -> Base
+        self.structure_bases = {}  # townhall or refinery tag -> Base
+
+    def setup(self):
+        self.bases.clear()
+        self.resource_bases.clear()
+        self.structure_bases.clear()
+        for location, resources in self.bot.expansion_locations_dict.items():
+            base = Base(location)
+            self.bases.append(base)
+            for resource in resources:
+                self.resource_bases[resource.tag] = base
+                # Snapshots in the fog report no contents
+                if resource.is_mineral_field:
+                    base.minerals[resource.tag] = resource.mineral_contents if resource.is_visible else None
+                else:
+                    base.geysers[resource.tag] = resource.vespene_contents if resource.is_visible else None
+                    base.geyser_positions[resource.tag] = resource.position
+        for structure in self.bot.structures:
+            self.structure_added(structure)
+
+    def base_near(self, position, distance):
+        for base in self.bases:
+            if base.location.distance_to(position) < distance:
+                return base
+        return None
+
+    def owned(self, ready=False):
+        bases = [base for base in self.bases if base.townhall is not None]
+        if ready:
+            ready_tags = {townhall.tag for townhall in self.bot.townhalls.ready}
+            bases = [base for base in bases if base.townhall in ready_tags]
+        return bases
+
+    # Our townhalls and refineries claim their base as soon as construction starts; a townhall that lifts off
+    # gives its base up until it lands again
+    def structure_added(self, structure):
+        if structure.tag in self.structure_bases and structure.type_id not in REFINERY_TYPES:
+            self.unit_destroyed(structure.tag)
+        if structure.type_id in TOWNHALL_TYPES:
+            base = self.base_near(structure.position, self.TOWNHALL_DISTANCE)
+            if base:
+                base.townhall = structure.tag
+                self.structure_bases[structure.tag] = base
+        elif structure.type_id in REFINERY_TYPES:
+            for base in self.bases:
+                for tag, position in base.geyser_positions.items():
+                    if position.distance_to(structure.position) < 1:
+                        base.refineries[tag] = structure.tag
+                        self.structure_bases[structure.tag] = base
+                        return
+
+    def unit_destroyed(self, unit_tag):
+        # Depleted mineral fields disappear like destroyed units
+        base = self.resource_bases.pop(unit_tag, None)
+        if base is not None:
+            base.minerals.pop(unit_tag, None)
+            return
+        base = self.structure_bases.pop(unit_tag, None)
+        if base is None:
+            return
+        if base.townhall == unit_tag:
+            base.townhall = None
+        for geyser, refinery in list(base.refineries.items()):
+            if refinery == unit_tag:
+                del base.refineries[geyser]
+
+    # Refresh remaining resources of our bases from what is in vision; cheap enough for a low cadence manager
+    def refresh(self):
+        visible = {resource.tag: resource for resource in self.bot.resources}
+        for refinery in self.bot.gas_buildings:
+            visible[refinery.tag] = refinery
+        for base in self.owned():
+            for tag in list(base.minerals):
+                if tag in visible and visible[tag].is_visible:
+                    base.minerals[tag] = visible[tag].mineral_contents
+            for tag in base.geysers:
+                # Fall back to the refinery on the geyser, which reports the gas that is left as well
+                source = visible.get(tag) or visible.get(base.refineries.get(tag))
+                if source is not None and source.is_visible:
+                    base.geysers[tag] = source.vespene_contents
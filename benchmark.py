@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import json
+import sys
+
+import numpy as np
+
+from headless import HeadlessGame, HeadlessWorld, make_scenario
+from StarCraftBot import StarCraftBot
+
+# Offline on_step latency benchmark against the headless game stand-in.
+#
+#   python benchmark.py                      # early/mid/late game with 50/200/400 units
+#   python benchmark.py --json results.json  # also write the numbers for comparison between commits
+#   python benchmark.py --recording game.json --steps 500
+#   python benchmark.py --max-p95-ms 40      # exit with an error if any scenario is slower than that
+
+SCENARIOS = [("early", 50), ("mid", 200), ("late", 400)]
+
+
+def run_scenario(world, steps, warmup, profile_dir=None):
+    bot = StarCraftBot(profile_dir=profile_dir)
+    game = HeadlessGame(bot, world)
+    step_times = asyncio.run(game.play(warmup + steps))[warmup:]
+    if profile_dir:
+        asyncio.run(bot.on_end(None))
+    step_ms = np.array(step_times) * 1000
+    p50, p95, p99 = np.percentile(step_ms, [50, 95, 99])
+    return {
+        "steps": len(step_ms),
+        "mean_ms": round(float(step_ms.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(step_ms.max()), 3),
+        "actions": len(world.actions),
+        "placement_queries": game.client.placement_queries,
+        "pathing_queries": game.client.pathing_queries,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark StarCraftBot.on_step without a StarCraft II client")
+    parser.add_argument("--steps", type=int, default=100, help="measured steps per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured steps before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--recording", help="replay a recorded snapshot file instead of the synthetic scenarios")
+    parser.add_argument("--profile-dir", help="also write per-manager profiles to this directory")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--max-p95-ms", type=float, help="fail if any scenario's p95 step time exceeds this")
+    args = parser.parse_args(argv)
+
+    if args.recording:
+        scenarios = {"recording": lambda: HeadlessWorld.from_recording(args.recording)}
+    else:
+        scenarios = {f"{phase}-{units}": (lambda phase=phase, units=units: make_scenario(phase, units, args.seed))
+                     for phase, units in SCENARIOS}
+
+    results = {}
+    for name, make_world in scenarios.items():
+        profile_dir = f"{args.profile_dir}/{name}" if args.profile_dir else None
+        results[name] = run_scenario(make_world(), args.steps, args.warmup, profile_dir)
+        row = results[name]
+        print(f"{name:>12}: mean {row['mean_ms']:8.3f} ms  p50 {row['p50_ms']:8.3f}  p95 {row['p95_ms']:8.3f}  "
+              f"p99 {row['p99_ms']:8.3f}  max {row['max_ms']:8.3f}  actions {row['actions']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.max_p95_ms is not None:
+        slow = [name for name, row in results.items() if row["p95_ms"] > args.max_p95_ms]
+        if slow:
+            print(f"p95 step time above {args.max_p95_ms} ms in: {', '.join(slow)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
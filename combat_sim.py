@@ -0,0 +1,163 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+GROUND_WEAPON, AIR_WEAPON, ANY_WEAPON = 1, 2, 3
+
+
+class CombatPrediction:
+    def __init__(self, winner, our_value, enemy_value, our_survivors, enemy_survivors, duration):
+        self.winner = winner  # "us", "enemy" or "draw"
+        self.our_value = our_value  # Resource value we started the fight with
+        self.enemy_value = enemy_value
+        self.our_survivors = our_survivors  # Resource value left standing when the fight ends
+        self.enemy_survivors = enemy_survivors
+        self.duration = duration  # Simulated seconds until the fight was decided
+
+    def __repr__(self):
+        return (f"CombatPrediction({self.winner}, ours {self.our_survivors:.0f}/{self.our_value:.0f}, "
+                f"theirs {self.enemy_survivors:.0f}/{self.enemy_value:.0f}, {self.duration:.1f}s)")
+
+
+# Stats of one unit type at given upgrade levels, built from the game's weapon data
+class UnitTypeStats:
+    def __init__(self, unit):
+        type_data = unit._type_data
+        self.hp = unit.health_max + unit.shield_max
+        self.armor = type_data._proto.armor + unit.armor_upgrade_level
+        self.is_flying = unit.is_flying
+        self.attributes = set(type_data._proto.attributes)
+        cost = type_data.cost
+        self.value = cost.minerals + cost.vespene
+        # (damage per attack, attacks, cooldown, range, {attribute: bonus}) for ground and air targets
+        self.ground = None
+        self.air = None
+        for weapon in unit._weapons:
+            profile = (weapon.damage + unit.attack_upgrade_level, weapon.attacks, weapon.speed, weapon.range,
+                       {bonus.attribute: bonus.bonus for bonus in weapon.damage_bonus})
+            if weapon.type in {GROUND_WEAPON, ANY_WEAPON}:
+                self.ground = profile
+            if weapon.type in {AIR_WEAPON, ANY_WEAPON}:
+                self.air = profile
+
+    # Damage per second this type deals to the target type after armour and bonus damage
+    def dps_against(self, target):
+        weapon = self.air if target.is_flying else self.ground
+        if weapon is None:
+            return 0.0
+        damage, attacks, cooldown, _, bonuses = weapon
+        damage += sum(bonus for attribute, bonus in bonuses.items() if attribute in target.attributes)
+        return max(damage - target.armor, 0.5) * attacks / max(cooldown, 0.1)
+
+    def range_against(self, target):
+        weapon = self.air if target.is_flying else self.ground
+        return weapon[3] if weapon else 0.0
+
+
+# Lanchester-style engagement predictor working on unit-type groups, so a 100-vs-100 fight is a handful of
+# small matrix products per simulated tick. Results are cached per composition.
+class CombatSimulator:
+    TIME_STEP = 0.5  # Simulated seconds per tick
+    MAX_DURATION = 40  # Fights that last longer are decided by the remaining value
+    CLOSING_SPEED = 2.5  # How fast the armies close the distance until the shorter ranged units can fire
+    HP_BUCKETS = 10  # Group health is rounded to this many steps for the composition cache key
+    CACHE_SIZE = 512
+
+    def __init__(self):
+        self.type_stats = {}
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def stats_for(self, unit):
+        key = (unit.type_id, unit.attack_upgrade_level, unit.armor_upgrade_level)
+        stats = self.type_stats.get(key)
+        if stats is None:
+            stats = self.type_stats[key] = UnitTypeStats(unit)
+        return stats
+
+    # Collapse units into (stats, count, total hp) groups
+    def group(self, units):
+        groups = {}
+        for unit in units:
+            stats = self.stats_for(unit)
+            count, hp = groups.get(stats, (0, 0.0))
+            groups[stats] = (count + 1, hp + unit.health + unit.shield)
+        return [(stats, count, hp) for stats, (count, hp) in groups.items()]
+
+    def composition_key(self, groups):
+        return tuple(sorted(
+            (id(stats), count, round(hp / (stats.hp * count) * self.HP_BUCKETS)) for stats, count, hp in groups
+        ))
+
+    def predict(self, our_units, enemy_units):
+        ours = self.group(our_units)
+        theirs = self.group(enemy_units)
+        key = (self.composition_key(ours), self.composition_key(theirs))
+        prediction = self.cache.get(key)
+        if prediction is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return prediction
+
+        self.misses += 1
+        prediction = self.simulate(ours, theirs)
+        self.cache[key] = prediction
+        if len(self.cache) > self.CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return prediction
+
+    def simulate(self, ours, theirs):
+        # Both armies share one state vector (ours first) and one block dps matrix, so every tick is a few
+        # small array operations regardless of how many units are fighting
+        groups = ours + theirs
+        split = len(ours)
+        hp = np.array([hp for _, _, hp in groups], dtype=float)
+        unit_hp = np.array([stats.hp for stats, _, _ in groups], dtype=float)
+        value = np.array([stats.value for stats, _, _ in groups], dtype=float)
+        alive = np.ceil(hp / unit_hp)
+        our_value = float(alive[:split] @ value[:split])
+        enemy_value = float(alive[split:] @ value[split:])
+        if not ours or not theirs:
+            winner = "us" if ours else ("enemy" if theirs else "draw")
+            return CombatPrediction(winner, our_value, enemy_value, our_value, enemy_value, 0.0)
+
+        # Per-unit dps of every group against every opposing group, and when each group gets into range
+        dps = np.zeros((len(groups), len(groups)))
+        attack_range = np.zeros(len(groups))
+        for i, (attacker, _, _) in enumerate(groups):
+            targets = range(split, len(groups)) if i < split else range(split)
+            for j in targets:
+                dps[i, j] = attacker.dps_against(groups[j][0])
+                attack_range[i] = max(attack_range[i], attacker.range_against(groups[j][0]))
+        can_hit = (dps > 0).astype(float)
+        delay = (attack_range.max() - attack_range) / self.CLOSING_SPEED
+        all_in_range = delay.max()
+
+        elapsed = 0.0
+        while elapsed < self.MAX_DURATION:
+            if not alive[:split].any() or not alive[split:].any():
+                break
+            # Every attacker spreads its fire over the living groups it can hit
+            targets = can_hit * alive
+            share = targets / np.maximum(targets.sum(axis=1, keepdims=True), 1)
+            damage = (alive * (delay <= elapsed)) @ (dps * share)
+            if elapsed >= all_in_range and not damage.any():
+                break  # Neither side can hurt the other
+            hp -= damage * self.TIME_STEP
+            alive = np.ceil(np.maximum(hp, 0) / unit_hp)
+            elapsed += self.TIME_STEP
+
+        our_left = float(alive[:split] @ value[:split])
+        enemy_left = float(alive[split:] @ value[split:])
+        # Decided fights go to the last side standing, undecided ones to whoever kept more of their value
+        our_ratio = our_left / max(our_value, 1)
+        enemy_ratio = enemy_left / max(enemy_value, 1)
+        if math.isclose(our_ratio, enemy_ratio):
+            winner = "draw"
+        elif our_ratio > enemy_ratio:
+            winner = "us"
+        else:
+            winner = "enemy"
+        return CombatPrediction(winner, our_value, enemy_value, our_left, enemy_left, elapsed)
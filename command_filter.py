@@ -0,0 +1,103 @@
+from collections import Counter
+
+from sc2.ids.ability_id import AbilityId
+from sc2.position import Point2
+
+
+# Drops unit commands that would not change anything: the unit already carries that exact order, or the same
+# order was sent to it a moment ago. Runs over BotAI.actions right before they are submitted.
+class CommandFilter:
+    # Only plain movement/targeting orders are filtered; training, building and research always go through
+    FILTERED_ABILITIES = {
+        AbilityId.ATTACK, AbilityId.ATTACK_ATTACK, AbilityId.MOVE, AbilityId.MOVE_MOVE, AbilityId.SMART,
+        AbilityId.PATROL, AbilityId.PATROL_PATROL, AbilityId.HARVEST_GATHER, AbilityId.HARVEST_GATHER_SCV,
+    }
+    GENERIC_ABILITIES = {
+        AbilityId.ATTACK_ATTACK: AbilityId.ATTACK,
+        AbilityId.MOVE_MOVE: AbilityId.MOVE,
+        AbilityId.PATROL_PATROL: AbilityId.PATROL,
+        AbilityId.HARVEST_GATHER_SCV: AbilityId.HARVEST_GATHER,
+    }
+    RESEND_WINDOW = 22  # Game loops during which an identical order to the same unit counts as a duplicate
+    POSITION_TOLERANCE = 0.5  # Two target points closer than this are considered the same target
+    PRUNE_INTERVAL = 224  # Game loops between sweeps of stale entries in recent_orders
+
+    def __init__(self):
+        # tag -> (ability, target key, game loop) of the last order sent to that unit
+        self.recent_orders = {}
+        # (action index, manager) boundaries recorded during the current step
+        self.marks = []
+        self.last_prune = 0
+        self.sent = Counter()
+        self.suppressed = Counter()
+
+    # Attribute every action appended from now on to the given manager
+    def mark(self, manager, action_count):
+        self.marks.append((action_count, manager))
+
+    def manager_for(self, action_index):
+        manager = "unknown"
+        for start, name in self.marks:
+            if start > action_index:
+                break
+            manager = name
+        return manager
+
+    def filter_actions(self, actions, game_loop):
+        kept = []
+        for index, action in enumerate(actions):
+            manager = self.manager_for(index)
+            if self.is_duplicate(action, game_loop):
+                self.suppressed[manager] += 1
+                continue
+            kept.append(action)
+            self.sent[manager] += 1
+
+        actions[:] = kept
+        self.marks.clear()
+
+        # Forget orders that fell out of the resend window so the table stays bounded
+        if game_loop - self.last_prune >= self.PRUNE_INTERVAL:
+            self.last_prune = game_loop
+            for tag in [tag for tag, (_, _, loop) in self.recent_orders.items()
+                        if game_loop - loop > self.RESEND_WINDOW]:
+                del self.recent_orders[tag]
+
+    def is_duplicate(self, action, game_loop):
+        if action.queue or action.ability not in self.FILTERED_ABILITIES:
+            return False
+
+        unit = action.unit
+        target = self.target_key(action.target)
+        ability = self.GENERIC_ABILITIES.get(action.ability, action.ability)
+
+        # The unit is already executing this order
+        if unit.orders:
+            order = unit.orders[0]
+            if order.ability.id == ability and self.same_target(order.target, target):
+                return True
+
+        # The same order went out recently and may not be visible in the unit's orders yet
+        recent = self.recent_orders.get(unit.tag)
+        if recent and recent[0] == ability and game_loop - recent[2] <= self.RESEND_WINDOW and self.same_target(
+                recent[1], target):
+            return True
+
+        self.recent_orders[unit.tag] = (ability, target, game_loop)
+        return False
+
+    # Unit targets are compared by tag, point targets by position
+    @staticmethod
+    def target_key(target):
+        if target is None or isinstance(target, Point2):
+            return target
+        return target.tag
+
+    def same_target(self, a, b):
+        if isinstance(a, Point2) and isinstance(b, Point2):
+            return a.distance_to_point2(b) <= self.POSITION_TOLERANCE
+        return a == b
+
+    def stats(self):
+        return {manager: {"sent": self.sent[manager], "suppressed": self.suppressed[manager]}
+                for manager in sorted(set(self.sent) | set(self.suppressed))}
@@ -0,0 +1,155 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.position import Point2
+
+from snapshot import VISIBLE
+
+TOWNHALL_TYPES = {
+    UnitTypeId.COMMANDCENTER, UnitTypeId.COMMANDCENTERFLYING, UnitTypeId.ORBITALCOMMAND,
+    UnitTypeId.ORBITALCOMMANDFLYING, UnitTypeId.PLANETARYFORTRESS, UnitTypeId.NEXUS, UnitTypeId.HATCHERY,
+    UnitTypeId.LAIR, UnitTypeId.HIVE,
+}
+
+
+# Everything the bot has seen of the enemy, kept after it leaves vision. One row per enemy tag in preallocated
+# columns, so the per-step update only touches the units currently visible and memory stays bounded.
+class EnemyMemory:
+    CAPACITY = 1024  # Rows; when full the entry seen longest ago is overwritten
+    UNIT_TTL = 22.4 * 60  # Game loops after which an unseen unit is forgotten
+    STRUCTURE_TTL = 22.4 * 60 * 10  # Structures stay put, so they are remembered much longer
+    DECAY = 22.4 * 30  # Game loops over which the confidence in an unseen entry falls to 1/e
+    CLUSTER_RADIUS = 10
+    SCAN_MIN_AGE = 22.4 * 10  # Only entries unseen for at least this long are worth a scan
+
+    def __init__(self, bot, capacity=None):
+        self.bot = bot
+        self.capacity = capacity or self.CAPACITY
+        self.tags = np.zeros(self.capacity, dtype=np.int64)
+        self.type_ids = np.zeros(self.capacity, dtype=np.int32)
+        self.positions = np.zeros((self.capacity, 2), dtype=np.float32)
+        self.health = np.zeros(self.capacity, dtype=np.float32)  # Health plus shields when last seen
+        self.values = np.zeros(self.capacity, dtype=np.float32)  # Minerals plus vespene
+        self.first_seen = np.zeros(self.capacity, dtype=np.int64)
+        self.last_seen = np.zeros(self.capacity, dtype=np.int64)
+        self.is_structure = np.zeros(self.capacity, dtype=bool)
+        self.is_townhall = np.zeros(self.capacity, dtype=bool)
+        self.active = np.zeros(self.capacity, dtype=bool)
+        self.slots = {}  # tag -> row
+        self.free_slots = list(range(self.capacity - 1, -1, -1))
+        self.game_loop = 0
+        self._type_info = {}
+
+    def __len__(self):
+        return len(self.slots)
+
+    # (value, is structure, is townhall) of a unit type, looked up once per type
+    def type_info(self, unit):
+        info = self._type_info.get(unit._proto.unit_type)
+        if info is None:
+            cost = unit._type_data.cost
+            info = self._type_info[unit._proto.unit_type] = (
+                cost.minerals + cost.vespene, unit.is_structure, unit.type_id in TOWNHALL_TYPES)
+        return info
+
+    def allocate(self, tag):
+        if not self.free_slots:
+            live = np.flatnonzero(self.active)
+            self.forget(live[np.argmin(self.last_seen[live])])
+        slot = self.free_slots.pop()
+        self.slots[tag] = slot
+        self.active[slot] = True
+        self.tags[slot] = tag
+        self.first_seen[slot] = self.game_loop
+        self.last_seen[slot] = self.game_loop
+        return slot
+
+    def forget(self, slot):
+        self.active[slot] = False
+        del self.slots[int(self.tags[slot])]
+        self.free_slots.append(slot)
+
+    def update(self):
+        state = self.bot.state
+        self.game_loop = state.game_loop
+
+        for tag in state.dead_units:
+            slot = self.slots.get(tag)
+            if slot is not None:
+                self.forget(slot)
+
+        # Only units actually in vision refresh their row; snapshots of structures in the fog add nothing new
+        snapshot = self.bot.snapshot
+        tables = (snapshot.enemy_units, snapshot.enemy_structures)
+        visible = [np.flatnonzero(table.rows["flags"] & VISIBLE) for table in tables]
+        seen = [table.units[i] for table, index in zip(tables, visible) for i in index.tolist()]
+        if seen:
+            seen_rows = np.concatenate([table.rows[index] for table, index in zip(tables, visible)])
+            rows = np.array([self.slots[tag] if tag in self.slots else self.allocate(tag)
+                             for tag in seen_rows["tag"].tolist()])
+            infos = [self.type_info(unit) for unit in seen]
+            self.type_ids[rows] = seen_rows["type"]
+            self.positions[rows] = seen_rows["position"]
+            self.health[rows] = seen_rows["hp"] + seen_rows["shield"]
+            self.values[rows], self.is_structure[rows], self.is_townhall[rows] = zip(*infos)
+            self.last_seen[rows] = self.game_loop
+
+        self.evict_stale()
+
+    # Forget entries that outlived their time to live, and remembered entries whose spot we can see right now
+    # without the unit being there
+    def evict_stale(self):
+        live = np.flatnonzero(self.active)
+        if not live.size:
+            return
+        age = self.game_loop - self.last_seen[live]
+        ttl = np.where(self.is_structure[live], self.STRUCTURE_TTL, self.UNIT_TTL)
+        stale = age > ttl
+
+        visibility = self.bot.state.visibility.data_numpy
+        cells = np.clip(self.positions[live].astype(np.int32), 0, [visibility.shape[1] - 1, visibility.shape[0] - 1])
+        stale |= (age > 0) & (visibility[cells[:, 1], cells[:, 0]] == 2)
+
+        for slot in live[stale]:
+            self.forget(slot)
+
+    # Confidence in each active row, 1 when seen this step and decaying while out of vision
+    def confidence(self, rows):
+        return np.exp(-(self.game_loop - self.last_seen[rows]) / self.DECAY)
+
+    # Center and weighted value of the densest group of remembered army units within the cluster radius
+    def largest_army_cluster(self, radius=None):
+        rows = np.flatnonzero(self.active & ~self.is_structure)
+        return self._densest(rows, self.values[rows] * self.confidence(rows), radius or self.CLUSTER_RADIUS)
+
+    # Value of all remembered army units, weighted by how likely they are still around
+    def army_value(self):
+        rows = np.flatnonzero(self.active & ~self.is_structure)
+        return float((self.values[rows] * self.confidence(rows)).sum())
+
+    # Position of the enemy townhall we learned about most recently, or None
+    def newest_expansion(self):
+        rows = np.flatnonzero(self.active & self.is_townhall)
+        if not rows.size:
+            return None
+        return Point2(self.positions[rows[np.argmax(self.first_seen[rows])]].tolist())
+
+    # Where a scan reveals the most: valuable entries we have not seen for a while, weighted by how likely
+    # they are still there
+    def best_scan_target(self, radius=None):
+        rows = np.flatnonzero(self.active & (self.game_loop - self.last_seen >= self.SCAN_MIN_AGE))
+        return self._densest(rows, self.values[rows] * self.confidence(rows), radius or self.CLUSTER_RADIUS)[0]
+
+    def _densest(self, rows, weights, radius):
+        if not rows.size:
+            return None, 0.0
+        positions = self.positions[rows].astype(float)
+        tree = cKDTree(positions)
+        pairs = tree.sparse_distance_matrix(tree, radius, output_type="ndarray")
+        # Every point is paired with itself too, so each total includes its own weight
+        totals = np.bincount(pairs["i"], weights=weights[pairs["j"]], minlength=rows.size)
+        best = int(np.argmax(totals))
+        members = pairs["j"][pairs["i"] == best]
+        center = np.average(positions[members], axis=0, weights=weights[members] + 1e-9)
+        return Point2(center.tolist()), float(totals[best])
@@ -0,0 +1,192 @@
+import multiprocessing
+from collections import OrderedDict
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from sc2.position import Point2
+
+from analysis_worker import AnalysisWorker
+from map_analysis import nearest_pathable_cell, pathing_edges
+
+
+# The 8-connected grid of pathable cells as a sparse graph, for Dijkstra runs from single destinations
+class PathingGraph:
+    def __init__(self, pathable):
+        self.pathable = pathable
+        self.cell_ids, self.rows, self.columns, self.lengths = pathing_edges(pathable)
+        self.graph = self.make_graph(self.lengths)
+
+    def make_graph(self, weights):
+        return coo_matrix((weights, (self.rows, self.columns)), shape=(self.pathable.sum(),) * 2).tocsr()
+
+    # Ground distance from every cell to the destination cell, inf if unreachable; with a threat grid every edge
+    # costs more the more threat lies on it
+    def distances(self, cell, threat=None, threat_weight=0.0):
+        graph = self.graph
+        if threat is not None:
+            threat = threat[self.pathable]
+            graph = self.make_graph(
+                self.lengths * (1 + threat_weight * (threat[self.rows] + threat[self.columns]) / 2))
+        distances = np.full(self.pathable.shape, np.inf, dtype=np.float32)
+        distances[self.pathable] = dijkstra(graph, directed=False, indices=self.cell_ids[cell])
+        return distances
+
+
+# Flat index of the neighbour of every cell that is closest to the destination
+def downhill(distances):
+    height, width = distances.shape
+    # Index 0 is the cell itself so the destination and unreachable cells point to themselves
+    padded = np.pad(distances, 1, constant_values=np.inf)
+    offsets = [(0, 0)] + [(dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx]
+    neighbours = np.stack([padded[1 + dy:1 + dy + height, 1 + dx:1 + dx + width] for dy, dx in offsets])
+    best = np.argmin(neighbours, axis=0)
+    rows, columns = np.mgrid[0:height, 0:width]
+    offsets = np.array(offsets)
+    return ((rows + offsets[best, 0]) * width + columns + offsets[best, 1]).ravel().astype(np.int32)
+
+
+# Ground distance from every cell to one destination, plus the downhill neighbour of every cell. Any number of
+# units share it: following the neighbours from a unit's cell walks the shortest ground route to the destination.
+class FlowField:
+    def __init__(self, cell, distances, next_cell=None):
+        self.cell = cell  # (row, column) of the destination
+        self.distances = distances  # (height, width) ground distance to the destination, inf if unreachable
+        self.next_cell = downhill(distances) if next_cell is None else next_cell
+
+    def cells(self, positions):
+        height, width = self.distances.shape
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        columns = np.clip(positions[:, 0].astype(np.int64), 0, width - 1)
+        rows = np.clip(positions[:, 1].astype(np.int64), 0, height - 1)
+        return rows * width + columns
+
+    def distance_at(self, position):
+        return float(self.distances.ravel()[self.cells([position])[0]])
+
+    # Cell reached from each position after following the field for the given number of cells, or None for
+    # positions that are already that close to the destination or have no ground route to it
+    def waypoints(self, positions, steps):
+        start = self.cells(positions)
+        cells = start
+        for _ in range(steps):
+            cells = self.next_cell[cells]
+        width = self.distances.shape[1]
+        remaining = self.distances.ravel()[start]
+        return [Point2((cell % width + 0.5, cell // width + 0.5)) if steps < left < np.inf else None
+                for cell, left in zip(cells.tolist(), remaining.tolist())]
+
+
+# Flow fields towards army destinations, computed with one Dijkstra over the pathing grid per destination cell and
+# kept in an LRU cache. Fields that route around enemy ground threat weigh every edge by the influence map and are
+# reused for a short while only, since the threat moves.
+#
+# With OFF_LOOP the Dijkstra runs in the analysis worker process: a field asked for on one step is handed out from
+# a later step on, and until then callers fall back to sending units straight to the destination.
+class FlowFields:
+    CACHE_SIZE = 16
+    LOOKAHEAD = 12  # Cells along the route between a unit and the waypoint it is sent to
+    THREAT_WEIGHT = 0.2  # Extra cost per cell for each point of ground threat dps on it
+    THREAT_REFRESH = 22.4 * 2  # Game loops a threat weighted field is reused
+    OFF_LOOP = True
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.pathable = None
+        self.graph = None
+        self.worker = None
+        self.pending = set()  # Keys of fields the worker is computing
+        self.failed = set()  # Keys the worker could not compute; those are computed on the game loop
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def setup(self):
+        self.pathable = self.bot.game_info.pathing_grid.data_numpy.astype(bool)
+        self.graph = PathingGraph(self.pathable)
+        self.cache.clear()
+        self.pending.clear()
+        self.failed.clear()
+        if not self.OFF_LOOP:
+            return
+        # Daemonic processes may not start processes of their own
+        if multiprocessing.current_process().daemon:
+            print("Computing flow fields on the game loop, no analysis worker in a daemonic process")
+            return
+        try:
+            self.worker = AnalysisWorker(self.pathable)
+        except OSError as e:
+            print(f"Computing flow fields on the game loop, no analysis worker: {e}")
+
+    # Take over the fields the worker finished since the last step
+    def update(self):
+        if self.worker is None:
+            return
+        for key, result in self.worker.poll():
+            self.pending.discard(key)
+            if result is None:
+                self.failed.add(key)
+                continue
+            distances, next_cell = result
+            self.store(key, FlowField(key[0], distances, next_cell))
+        if not self.worker.alive:
+            print("Analysis worker stopped, computing flow fields on the game loop")
+            self.worker.close()
+            self.worker = None
+            self.pending.clear()
+
+    def close(self):
+        if self.worker is not None:
+            self.worker.close()
+            self.worker = None
+
+    # The field towards the destination, or None while the worker is still computing it
+    def field(self, destination, avoid_threat=False):
+        cell = nearest_pathable_cell(self.pathable, destination)
+        key = (cell, int(self.bot.state.game_loop // self.THREAT_REFRESH) if avoid_threat else None)
+        field = self.cache.get(key)
+        if field is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return field
+        if key in self.pending:
+            return None
+        self.misses += 1
+
+        threat = self.bot.influence.ground_threat if avoid_threat else None
+        off_loop = self.worker is not None and key not in self.failed
+        if off_loop and self.worker.submit(key, cell, threat, self.THREAT_WEIGHT):
+            self.pending.add(key)
+            return None
+        return self.store(key, FlowField(cell, self.graph.distances(cell, threat, self.THREAT_WEIGHT)))
+
+    def store(self, key, field):
+        self.cache[key] = field
+        if len(self.cache) > self.CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return field
+
+    # Point the given ground distance along the route from start to destination
+    def along(self, start, destination, distance):
+        field = self.field(destination)
+        if field is None:
+            return Point2(start).towards(Point2(destination), distance)
+        distances = field.distances.ravel()
+        cell = int(field.cells([start])[0])
+        if not np.isfinite(distances[cell]):
+            return Point2(destination)
+        goal = distances[cell] - distance
+        while distances[cell] > goal and field.next_cell[cell] != cell:
+            cell = int(field.next_cell[cell])
+        width = field.distances.shape[1]
+        return Point2((cell % width + 0.5, cell // width + 0.5))
+
+    # Next point to head for from each position on the way to the destination; positions close to the
+    # destination or without a ground route to it head straight there
+    def route(self, positions, destination, avoid_threat=False):
+        destination = Point2(destination)
+        field = self.field(destination, avoid_threat)
+        if field is None:
+            return [destination] * len(positions)
+        return [waypoint or destination for waypoint in field.waypoints(positions, self.LOOKAHEAD)]
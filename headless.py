@@ -0,0 +1,594 @@
+import json
+import math
+import random
+import time
+
+import numpy as np
+from s2clientprotocol import common_pb2, data_pb2, error_pb2, raw_pb2
+from s2clientprotocol import sc2api_pb2 as sc_pb
+
+from sc2.client import Client
+from sc2.constants import geyser_ids, mineral_ids
+from sc2.data import Race
+from sc2.dicts.generic_redirect_abilities import GENERIC_REDIRECT_ABILITIES
+from sc2.dicts.unit_research_abilities import RESEARCH_INFO
+from sc2.dicts.unit_train_build_abilities import TRAIN_INFO
+from sc2.game_state import GameState
+from sc2.ids.ability_id import AbilityId
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.ids.upgrade_id import UpgradeId
+
+# Headless stand-in for the StarCraft II client. The world is a list of unit records that is turned into real
+# protobuf observations, so the bot runs against the unmodified python-sc2 BotAI machinery. Placement, pathing
+# and expansion queries are answered locally from the world's grids; nothing moves or fights on its own.
+
+SELF, NEUTRAL, ENEMY = 1, 3, 4
+LIGHT, ARMORED, BIOLOGICAL, MECHANICAL, MASSIVE, STRUCTURE = 1, 2, 3, 4, 7, 8
+GROUND, AIR, ANY = 1, 2, 3
+
+# Weapon entries are (target type, damage, attacks, range, cooldown, bonus attribute, bonus damage)
+UNIT_STATS = {
+    UnitTypeId.SCV: dict(cost=(50, 0), food=1, time=272, radius=0.375, health=45,
+                         attributes=(LIGHT, BIOLOGICAL, MECHANICAL), weapons=[(GROUND, 5, 1, 0.1, 1.07, 0, 0)]),
+    UnitTypeId.MARINE: dict(cost=(50, 0), food=1, time=386, radius=0.375, health=45,
+                            attributes=(LIGHT, BIOLOGICAL), weapons=[(ANY, 6, 1, 5, 0.61, 0, 0)]),
+    UnitTypeId.MARAUDER: dict(cost=(100, 25), food=2, time=430, radius=0.5625, health=125, armor=1,
+                              attributes=(ARMORED, BIOLOGICAL), weapons=[(GROUND, 10, 1, 6, 1.07, ARMORED, 10)]),
+    UnitTypeId.REAPER: dict(cost=(50, 50), food=1, time=430, radius=0.375, health=60,
+                            attributes=(LIGHT, BIOLOGICAL), weapons=[(GROUND, 4, 2, 5, 0.79, 0, 0)]),
+    UnitTypeId.SIEGETANK: dict(cost=(150, 125), food=3, time=717, radius=0.875, health=175, armor=1,
+                               attributes=(ARMORED, MECHANICAL), weapons=[(GROUND, 15, 1, 7, 0.74, ARMORED, 10)]),
+    UnitTypeId.SIEGETANKSIEGED: dict(cost=(150, 125), food=3, time=717, radius=0.875, health=175, armor=1,
+                                     attributes=(ARMORED, MECHANICAL),
+                                     weapons=[(GROUND, 40, 1, 13, 2.14, ARMORED, 30)]),
+    UnitTypeId.MEDIVAC: dict(cost=(100, 100), food=2, time=672, radius=0.75, health=150, armor=1, flying=True,
+                             attributes=(ARMORED, MECHANICAL), energy=200),
+    UnitTypeId.BANSHEE: dict(cost=(150, 100), food=3, time=717, radius=0.75, health=140, flying=True,
+                             attributes=(LIGHT, MECHANICAL), weapons=[(GROUND, 12, 2, 6, 0.89, 0, 0)], energy=200),
+    UnitTypeId.VIKINGFIGHTER: dict(cost=(150, 75), food=2, time=672, radius=0.75, health=135, flying=True,
+                                   attributes=(ARMORED, MECHANICAL), weapons=[(AIR, 10, 2, 9, 1.43, ARMORED, 4)]),
+    UnitTypeId.HELLION: dict(cost=(100, 0), food=2, time=480, radius=0.625, health=90,
+                             attributes=(LIGHT, MECHANICAL), weapons=[(GROUND, 8, 1, 5, 1.79, LIGHT, 6)]),
+    UnitTypeId.THOR: dict(cost=(300, 200), food=6, time=941, radius=1.25, health=400, armor=1,
+                          attributes=(ARMORED, MECHANICAL, MASSIVE),
+                          weapons=[(GROUND, 30, 2, 7, 0.91, 0, 0), (AIR, 6, 4, 10, 2.14, LIGHT, 6)]),
+    UnitTypeId.COMMANDCENTER: dict(cost=(400, 0), time=1590, radius=2.75, health=1500, armor=1, supply=15,
+                                   footprint=2.5, attributes=(ARMORED, MECHANICAL, STRUCTURE)),
+    UnitTypeId.ORBITALCOMMAND: dict(cost=(150, 0), time=560, radius=2.75, health=1500, armor=1, supply=15,
+                                    attributes=(ARMORED, MECHANICAL, STRUCTURE), energy=200),
+    UnitTypeId.PLANETARYFORTRESS: dict(cost=(150, 150), time=806, radius=2.75, health=1500, armor=3, supply=15,
+                                       attributes=(ARMORED, MECHANICAL, STRUCTURE),
+                                       weapons=[(GROUND, 40, 1, 6, 2, 0, 0)]),
+    UnitTypeId.SUPPLYDEPOT: dict(cost=(100, 0), time=470, radius=1.0, health=400, armor=1, supply=8, footprint=1,
+                                 attributes=(ARMORED, MECHANICAL, STRUCTURE)),
+    UnitTypeId.REFINERY: dict(cost=(75, 0), time=470, radius=1.75, health=500, armor=1, footprint=1.5,
+                              attributes=(ARMORED, MECHANICAL, STRUCTURE)),
+    UnitTypeId.BARRACKS: dict(cost=(150, 0), time=1030, radius=1.8125, health=1000, armor=1, footprint=1.5,
+                              attributes=(ARMORED, MECHANICAL, STRUCTURE)),
+    UnitTypeId.FACTORY: dict(cost=(150, 100), time=1030, radius=1.8125, health=1250, armor=1, footprint=1.5,
+                             attributes=(ARMORED, MECHANICAL, STRUCTURE)),
+    UnitTypeId.STARPORT: dict(cost=(150, 100), time=806, radius=1.8125, health=1300, armor=1, footprint=1.5,
+                              attributes=(ARMORED, MECHANICAL, STRUCTURE)),
+    UnitTypeId.ENGINEERINGBAY: dict(cost=(125, 0), time=560, radius=1.8125, health=850, armor=1, footprint=1.5,
+                                    attributes=(ARMORED, MECHANICAL, STRUCTURE)),
+    UnitTypeId.ARMORY: dict(cost=(150, 50), time=1030, radius=1.8125, health=750, armor=1, footprint=1.5,
+                            attributes=(ARMORED, MECHANICAL, STRUCTURE)),
+    UnitTypeId.BUNKER: dict(cost=(100, 0), time=650, radius=1.8125, health=400, armor=1, footprint=1.5,
+                            attributes=(ARMORED, MECHANICAL, STRUCTURE)),
+    UnitTypeId.MISSILETURRET: dict(cost=(100, 0), time=403, radius=1.0, health=250, footprint=1,
+                                   attributes=(ARMORED, MECHANICAL, STRUCTURE),
+                                   weapons=[(AIR, 12, 2, 7, 0.61, 0, 0)]),
+    UnitTypeId.BARRACKSTECHLAB: dict(cost=(50, 25), time=403, radius=1.0, health=400, armor=1, footprint=1,
+                                     attributes=(ARMORED, MECHANICAL, STRUCTURE)),
+    UnitTypeId.FACTORYTECHLAB: dict(cost=(50, 25), time=403, radius=1.0, health=400, armor=1, footprint=1,
+                                    attributes=(ARMORED, MECHANICAL, STRUCTURE)),
+    UnitTypeId.STARPORTTECHLAB: dict(cost=(50, 25), time=403, radius=1.0, health=400, armor=1, footprint=1,
+                                     attributes=(ARMORED, MECHANICAL, STRUCTURE)),
+    UnitTypeId.MINERALFIELD: dict(radius=1.125, minerals=1800, attributes=(STRUCTURE,)),
+    UnitTypeId.VESPENEGEYSER: dict(radius=1.8125, vespene=2250, attributes=(STRUCTURE,)),
+}
+
+UPGRADE_COSTS = {
+    UpgradeId.TERRANINFANTRYWEAPONSLEVEL1: (100, 100, 2560),
+    UpgradeId.TERRANINFANTRYARMORSLEVEL1: (100, 100, 2560),
+    UpgradeId.STIMPACK: (100, 100, 2240),
+    UpgradeId.SHIELDWALL: (100, 100, 1760),
+    UpgradeId.TERRANVEHICLEWEAPONSLEVEL1: (100, 100, 2560),
+    UpgradeId.TERRANVEHICLEANDSHIPARMORSLEVEL1: (100, 100, 2560),
+    UpgradeId.HISECAUTOTRACKING: (100, 100, 1280),
+    UpgradeId.TERRANBUILDINGARMOR: (150, 150, 2240),
+}
+
+# Add-ons are not listed in python-sc2's train/build tables
+ADDON_ABILITIES = {
+    UnitTypeId.BARRACKSTECHLAB: AbilityId.BUILD_TECHLAB_BARRACKS,
+    UnitTypeId.FACTORYTECHLAB: AbilityId.BUILD_TECHLAB_FACTORY,
+    UnitTypeId.STARPORTTECHLAB: AbilityId.BUILD_TECHLAB_STARPORT,
+    UnitTypeId.BARRACKSREACTOR: AbilityId.BUILD_REACTOR_BARRACKS,
+    UnitTypeId.FACTORYREACTOR: AbilityId.BUILD_REACTOR_FACTORY,
+    UnitTypeId.STARPORTREACTOR: AbilityId.BUILD_REACTOR_STARPORT,
+}
+
+WORKER_INCOME_PER_LOOP = 0.9 / 22.4  # Roughly 55 minerals per worker per game minute
+ARMY_TYPES = [UnitTypeId.MARINE, UnitTypeId.MARINE, UnitTypeId.MARINE, UnitTypeId.MARAUDER, UnitTypeId.SIEGETANK,
+              UnitTypeId.MEDIVAC]
+
+
+def build_game_data():
+    # Creation abilities per unit type, and which of them need a placement position
+    creation_ability = dict(ADDON_ABILITIES)
+    target_types = {}
+    for ability in ADDON_ABILITIES.values():
+        for addon_ability in (ability, GENERIC_REDIRECT_ABILITIES.get(ability, ability)):
+            target_types[addon_ability] = getattr(data_pb2.AbilityData, "None")
+    for producer, trained in TRAIN_INFO.items():
+        for unit_type, info in trained.items():
+            creation_ability.setdefault(unit_type, info["ability"])
+            if info.get("requires_placement_position"):
+                target_types[info["ability"]] = data_pb2.AbilityData.Point
+            elif unit_type in {UnitTypeId.REFINERY, UnitTypeId.REFINERYRICH}:
+                target_types[info["ability"]] = data_pb2.AbilityData.Unit
+            else:
+                target_types[info["ability"]] = getattr(data_pb2.AbilityData, "None")
+    for upgrades in RESEARCH_INFO.values():
+        for info in upgrades.values():
+            target_types[info["ability"]] = getattr(data_pb2.AbilityData, "None")
+    for ability in (AbilityId.SIEGEMODE_SIEGEMODE, AbilityId.UNSIEGE_UNSIEGE, AbilityId.STOP, AbilityId.HOLDPOSITION):
+        target_types[ability] = getattr(data_pb2.AbilityData, "None")
+
+    footprints = {creation_ability[unit_type]: stats["footprint"] for unit_type, stats in UNIT_STATS.items()
+                  if "footprint" in stats and unit_type in creation_ability}
+
+    response = sc_pb.ResponseData()
+    for ability in AbilityId:
+        if ability.value == 0:
+            continue
+        redirect = GENERIC_REDIRECT_ABILITIES.get(ability)
+        response.abilities.add(
+            ability_id=ability.value, link_name=ability.name, button_name=ability.name, friendly_name=ability.name,
+            remaps_to_ability_id=redirect.value if redirect else 0, available=True,
+            target=target_types.get(ability, data_pb2.AbilityData.PointOrUnit),
+            footprint_radius=footprints.get(ability, 0), is_building=ability in footprints,
+        )
+
+    for unit_type in UnitTypeId:
+        if unit_type.value == 0:
+            continue
+        stats = UNIT_STATS.get(unit_type, {})
+        if unit_type.value in mineral_ids:
+            stats = UNIT_STATS[UnitTypeId.MINERALFIELD]
+        elif unit_type.value in geyser_ids:
+            stats = UNIT_STATS[UnitTypeId.VESPENEGEYSER]
+        minerals, vespene = stats.get("cost", (0, 0))
+        proto = response.units.add(
+            unit_id=unit_type.value, name=unit_type.name, available=True, race=Race.Terran.value,
+            mineral_cost=minerals, vespene_cost=vespene, food_required=stats.get("food", 0),
+            food_provided=stats.get("supply", 0), build_time=stats.get("time", 0), armor=stats.get("armor", 0),
+            sight_range=9, movement_speed=0 if STRUCTURE in stats.get("attributes", ()) else 3.15,
+            has_minerals="minerals" in stats, has_vespene="vespene" in stats,
+            ability_id=creation_ability[unit_type].value if unit_type in creation_ability else 0,
+        )
+        proto.attributes.extend(stats.get("attributes", ()))
+        for target, damage, attacks, weapon_range, speed, bonus_attribute, bonus in stats.get("weapons", ()):
+            weapon = proto.weapons.add(type=target, damage=damage, attacks=attacks, range=weapon_range, speed=speed)
+            if bonus:
+                weapon.damage_bonus.add(attribute=bonus_attribute, bonus=bonus)
+
+    for upgrades in RESEARCH_INFO.values():
+        for upgrade, info in upgrades.items():
+            minerals, vespene, research_time = UPGRADE_COSTS.get(upgrade, (100, 100, 2000))
+            response.upgrades.add(upgrade_id=upgrade.value, name=upgrade.name, mineral_cost=minerals,
+                                  vespene_cost=vespene, research_time=research_time, ability_id=info["ability"].value)
+    return response
+
+
+# One unit in the headless world; converted to a raw protobuf unit for every observation
+class HeadlessUnit:
+    def __init__(self, tag, type_id, alliance, x, y, build_progress=1.0, health=None, energy=None, orders=None,
+                 contents=None):
+        stats = UNIT_STATS.get(type_id, {})
+        self.tag = tag
+        self.type_id = type_id
+        self.alliance = alliance
+        self.x = x
+        self.y = y
+        self.build_progress = build_progress
+        self.health_max = stats.get("health", 100)
+        self.health = self.health_max if health is None else health
+        self.energy = stats.get("energy", 0) * 0.5 if energy is None else energy
+        # Orders are (ability id, target) with target a tag, an (x, y) tuple or None
+        self.orders = orders or []
+        self.add_on_tag = 0
+        if contents is None:
+            contents = stats.get("minerals", 0) or stats.get("vespene", 0)
+        self.contents = contents
+
+    @property
+    def stats(self):
+        if self.type_id.value in mineral_ids:
+            return UNIT_STATS[UnitTypeId.MINERALFIELD]
+        if self.type_id.value in geyser_ids:
+            return UNIT_STATS[UnitTypeId.VESPENEGEYSER]
+        return UNIT_STATS.get(self.type_id, {})
+
+    def to_proto(self, assigned_harvesters=0, ideal_harvesters=0):
+        stats = self.stats
+        proto = raw_pb2.Unit(
+            display_type=raw_pb2.Visible, alliance=self.alliance, tag=self.tag, unit_type=self.type_id.value,
+            owner=16 if self.alliance == NEUTRAL else (1 if self.alliance == SELF else 2),
+            pos=common_pb2.Point(x=self.x, y=self.y, z=10), radius=stats.get("radius", 0.5),
+            build_progress=self.build_progress, cloak=raw_pb2.NotCloaked, is_flying=stats.get("flying", False),
+            health=self.health, health_max=self.health_max, energy=self.energy,
+            energy_max=stats.get("energy", 0), is_powered=True, add_on_tag=self.add_on_tag,
+            assigned_harvesters=assigned_harvesters, ideal_harvesters=ideal_harvesters,
+        )
+        if self.type_id.value in mineral_ids:
+            proto.mineral_contents = int(self.contents)
+        elif self.type_id.value in geyser_ids or self.type_id == UnitTypeId.REFINERY:
+            proto.vespene_contents = int(self.contents)
+        for ability, target in self.orders:
+            order = proto.orders.add(ability_id=ability)
+            if isinstance(target, tuple):
+                order.target_world_space_pos.x, order.target_world_space_pos.y = target
+            elif target:
+                order.target_unit_tag = target
+        return proto
+
+    def to_snapshot(self):
+        return [self.tag, self.type_id.value, self.alliance, self.x, self.y, self.build_progress, self.health,
+                self.energy, self.contents]
+
+    @classmethod
+    def from_snapshot(cls, row):
+        tag, type_id, alliance, x, y, build_progress, health, energy, contents = row
+        return cls(tag, UnitTypeId(type_id), alliance, x, y, build_progress, health, energy, contents=contents)
+
+
+# Map grids, units, resources and the game clock of a headless game
+class HeadlessWorld:
+    def __init__(self, width=128, height=128, start_location=(30.5, 30.5), enemy_start_location=(97.5, 97.5),
+                 map_name="headless"):
+        self.width = width
+        self.height = height
+        self.map_name = map_name
+        self.start_location = start_location
+        self.enemy_start_location = enemy_start_location
+        # Open map with a two cell unplaceable border
+        self.pathing_grid = np.ones((height, width), dtype=bool)
+        self.placement_grid = np.zeros((height, width), dtype=bool)
+        self.placement_grid[2:-2, 2:-2] = True
+        self.terrain_height = np.full((height, width), 128, dtype=np.uint8)
+        self.units = {}
+        self.game_loop = 0
+        self.minerals = 50
+        self.vespene = 0
+        self.upgrades = set()
+        self.actions = []  # Every raw action the bot sent, for inspection by tests and benchmarks
+        self.snapshots = []  # Optional recorded unit lists replayed one per step
+        self._next_tag = 1
+
+    def add_unit(self, type_id, alliance, x, y, **kwargs):
+        unit = HeadlessUnit(self._next_tag, type_id, alliance, x, y, **kwargs)
+        self.units[unit.tag] = unit
+        self._next_tag += 1
+        return unit
+
+    def add_base(self, x, y, owner=None):
+        # Eight mineral patches in an arc and two geysers on the side facing away from the map center
+        direction = -1 if x < self.width / 2 else 1
+        for i in range(8):
+            angle = math.pi * (i / 7 - 0.5) / 1.5
+            self.add_unit(UnitTypeId.MINERALFIELD, NEUTRAL, x + direction * 7 * math.cos(angle),
+                          y + 7 * math.sin(angle))
+        self.add_unit(UnitTypeId.VESPENEGEYSER, NEUTRAL, x + direction * 3.5, y + direction * 7.5)
+        self.add_unit(UnitTypeId.VESPENEGEYSER, NEUTRAL, x - direction * 4.5, y - direction * 6.5)
+        if owner is not None:
+            return self.add_unit(UnitTypeId.COMMANDCENTER, owner, x, y)
+        return None
+
+    @property
+    def supply(self):
+        food_used = food_cap = 0
+        for unit in self.units.values():
+            if unit.alliance != SELF:
+                continue
+            food_used += unit.stats.get("food", 0)
+            if unit.build_progress >= 1:
+                food_cap += unit.stats.get("supply", 0)
+        return food_used, min(food_cap, 200)
+
+    def own_workers(self):
+        return [unit for unit in self.units.values() if unit.alliance == SELF and unit.type_id == UnitTypeId.SCV]
+
+    # Advance the clock, add worker income and construction progress, then replay the next recorded snapshot
+    def advance(self, game_loops):
+        self.game_loop += game_loops
+        self.minerals += WORKER_INCOME_PER_LOOP * game_loops * len(self.own_workers())
+        self.vespene += WORKER_INCOME_PER_LOOP * game_loops * 0.3 * len(self.own_workers())
+        for unit in self.units.values():
+            if unit.build_progress < 1:
+                build_time = unit.stats.get("time", 0) or 1
+                unit.build_progress = min(1.0, unit.build_progress + game_loops / build_time)
+        if self.snapshots:
+            self.load_snapshot(self.snapshots.pop(0))
+
+    # Only a 2-d open map is modelled, so the ground distance is the straight line distance
+    def pathing_distance(self, start, end):
+        return math.hypot(end[0] - start[0], end[1] - start[1])
+
+    def can_place(self, footprint_radius, x, y):
+        left, right = int(round(x - footprint_radius)), int(round(x + footprint_radius))
+        bottom, top = int(round(y - footprint_radius)), int(round(y + footprint_radius))
+        if left < 0 or bottom < 0 or right > self.width or top > self.height:
+            return False
+        if not self.placement_grid[bottom:top, left:right].all():
+            return False
+        for unit in self.units.values():
+            radius = unit.stats.get("footprint", unit.stats.get("radius", 0.5)) if STRUCTURE in unit.stats.get(
+                "attributes", ()) else 0
+            if radius and abs(unit.x - x) < radius + footprint_radius and abs(unit.y - y) < radius + footprint_radius:
+                return False
+        return True
+
+    def to_snapshot(self):
+        return {"game_loop": self.game_loop, "minerals": self.minerals, "vespene": self.vespene,
+                "units": [unit.to_snapshot() for unit in self.units.values()]}
+
+    def load_snapshot(self, snapshot):
+        self.game_loop = snapshot.get("game_loop", self.game_loop)
+        self.minerals = snapshot.get("minerals", self.minerals)
+        self.vespene = snapshot.get("vespene", self.vespene)
+        self.units = {row[0]: HeadlessUnit.from_snapshot(row) for row in snapshot["units"]}
+        self._next_tag = max(self.units, default=0) + 1
+
+    def save_snapshots(self, path, snapshots):
+        with open(path, "w") as f:
+            json.dump(snapshots, f)
+
+    @classmethod
+    def from_recording(cls, path, **kwargs):
+        world = cls(**kwargs)
+        with open(path) as f:
+            snapshots = json.load(f)
+        world.load_snapshot(snapshots[0])
+        world.snapshots = snapshots[1:]
+        return world
+
+
+# Record the current python-sc2 view of a live bot in the snapshot format used by HeadlessWorld
+def snapshot_from_bot(bot):
+    rows = []
+    for unit in bot.all_units:
+        alliance = SELF if unit.is_mine else (ENEMY if unit.is_enemy else NEUTRAL)
+        rows.append([unit.tag, unit.type_id.value, alliance, unit.position.x, unit.position.y, unit.build_progress,
+                     unit.health, unit.energy, unit.mineral_contents or unit.vespene_contents])
+    return {"game_loop": bot.state.game_loop, "minerals": bot.minerals, "vespene": bot.vespene, "units": rows}
+
+
+# python-sc2 Client whose requests are answered by a HeadlessWorld instead of a websocket
+class HeadlessClient(Client):
+    def __init__(self, world, game_step=8):
+        # There is no websocket; every request is answered in _execute
+        super().__init__(ws=world)
+        self.world = world
+        self.game_step = game_step
+        self._player_id = 1
+        self._game_result = None
+        self._game_data = build_game_data()
+        self.ability_footprints = {ability.ability_id: ability.footprint_radius
+                                   for ability in self._game_data.abilities if ability.footprint_radius}
+        self.build_abilities = {unit.ability_id: unit.unit_id for unit in self._game_data.units
+                                if unit.ability_id in self.ability_footprints}
+        self.placement_queries = 0
+        self.pathing_queries = 0
+
+    @property
+    def in_game(self):
+        return True
+
+    async def _execute(self, **kwargs):
+        assert len(kwargs) == 1, "Only one request allowed by the API"
+        (request, value), = kwargs.items()
+        handler = getattr(self, f"_handle_{request}", None)
+        response = sc_pb.Response(status=sc_pb.in_game)
+        if handler:
+            handler(value, response)
+        return response
+
+    def _handle_data(self, request, response):
+        response.data.CopyFrom(self._game_data)
+
+    def _handle_ping(self, request, response):
+        response.ping.base_build = -1
+
+    def _handle_game_info(self, request, response):
+        world = self.world
+        info = response.game_info
+        info.map_name = world.map_name
+        info.player_info.add(player_id=1, type=sc_pb.Participant, race_requested=Race.Terran.value,
+                             race_actual=Race.Terran.value)
+        info.player_info.add(player_id=2, type=sc_pb.Computer, race_requested=Race.Terran.value,
+                             race_actual=Race.Terran.value, difficulty=sc_pb.Hard)
+        raw = info.start_raw
+        raw.map_size.x, raw.map_size.y = world.width, world.height
+        for grid, values in ((raw.pathing_grid, world.pathing_grid), (raw.placement_grid, world.placement_grid)):
+            grid.bits_per_pixel = 1
+            grid.size.x, grid.size.y = world.width, world.height
+            grid.data = np.packbits(values.astype(np.uint8)).tobytes()
+        raw.terrain_height.bits_per_pixel = 8
+        raw.terrain_height.size.x, raw.terrain_height.size.y = world.width, world.height
+        raw.terrain_height.data = world.terrain_height.tobytes()
+        raw.playable_area.p0.x, raw.playable_area.p0.y = 2, 2
+        raw.playable_area.p1.x, raw.playable_area.p1.y = world.width - 2, world.height - 2
+        raw.start_locations.add(x=world.enemy_start_location[0], y=world.enemy_start_location[1])
+
+    def _handle_observation(self, request, response):
+        world = self.world
+        observation = response.observation.observation
+        observation.game_loop = world.game_loop
+        food_used, food_cap = world.supply
+        workers = world.own_workers()
+        observation.player_common.CopyFrom(sc_pb.PlayerCommon(
+            player_id=1, minerals=int(world.minerals), vespene=int(world.vespene), food_cap=food_cap,
+            food_used=food_used, food_workers=len(workers), food_army=food_used - len(workers),
+            idle_worker_count=sum(1 for worker in workers if not worker.orders),
+        ))
+        raw = observation.raw_data
+        raw.player.upgrade_ids.extend(upgrade.value for upgrade in world.upgrades)
+        for name, bits in (("visibility", 8), ("creep", 1)):
+            image = getattr(raw.map_state, name)
+            image.bits_per_pixel = bits
+            image.size.x, image.size.y = world.width, world.height
+            image.data = bytes([2] * (world.width * world.height)) if bits == 8 else bytes(
+                world.width * world.height // 8)
+
+        townhall_types = {UnitTypeId.COMMANDCENTER, UnitTypeId.ORBITALCOMMAND, UnitTypeId.PLANETARYFORTRESS}
+        for unit in world.units.values():
+            assigned = ideal = 0
+            if unit.alliance == SELF and unit.type_id in townhall_types:
+                ideal = 16
+                assigned = sum(1 for worker in workers if worker.orders and abs(worker.x - unit.x) < 10 and abs(
+                    worker.y - unit.y) < 10)
+            elif unit.alliance == SELF and unit.type_id == UnitTypeId.REFINERY:
+                ideal = 3
+                assigned = sum(1 for worker in workers if any(target == unit.tag for _, target in worker.orders))
+            raw.units.append(unit.to_proto(assigned, ideal))
+
+    def _handle_step(self, request, response):
+        self.world.advance(request.count or self.game_step)
+
+    def _handle_query(self, request, response):
+        world = self.world
+        for path in request.pathing:
+            self.pathing_queries += 1
+            if path.HasField("start_pos"):
+                start = (path.start_pos.x, path.start_pos.y)
+            else:
+                unit = world.units.get(path.unit_tag)
+                start = (unit.x, unit.y) if unit else None
+            distance = world.pathing_distance(start, (path.end_pos.x, path.end_pos.y)) if start else 0
+            response.query.pathing.add(distance=distance)
+        for placement in request.placements:
+            self.placement_queries += 1
+            footprint = self.ability_footprints.get(placement.ability_id, 1)
+            ok = world.can_place(footprint, placement.target_pos.x, placement.target_pos.y)
+            response.query.placements.add(
+                result=error_pb2.Success if ok else error_pb2.CantBuildLocationInvalid)
+        for _ in request.abilities:
+            response.query.abilities.add()
+
+    # Apply orders to the world: buildings get placed, everything else just carries the order
+    def _handle_action(self, request, response):
+        world = self.world
+        for action in request.actions:
+            world.actions.append(action)
+            command = action.action_raw.unit_command
+            target = None
+            if command.HasField("target_world_space_pos"):
+                target = (command.target_world_space_pos.x, command.target_world_space_pos.y)
+            elif command.HasField("target_unit_tag"):
+                target = command.target_unit_tag
+            for tag in command.unit_tags:
+                unit = world.units.get(tag)
+                if not unit:
+                    continue
+                if command.queue_command:
+                    unit.orders.append((command.ability_id, target))
+                else:
+                    unit.orders = [(command.ability_id, target)]
+            if command.ability_id in self.build_abilities and target is not None:
+                structure_type = UnitTypeId(self.build_abilities[command.ability_id])
+                if isinstance(target, tuple):
+                    world.add_unit(structure_type, SELF, target[0], target[1], build_progress=0.01)
+                elif target in world.units:
+                    geyser = world.units[target]
+                    # Refineries report the gas left in their geyser
+                    world.add_unit(structure_type, SELF, geyser.x, geyser.y, build_progress=0.01,
+                                   contents=geyser.contents)
+                minerals, vespene = UNIT_STATS.get(structure_type, {}).get("cost", (0, 0))
+                world.minerals -= minerals
+                world.vespene -= vespene
+            response.action.result.append(error_pb2.Success)
+
+    def _handle_debug(self, request, response):
+        pass
+
+
+# Drive a bot through a headless game the same way sc2.main._play_game_ai does, timing every on_step call
+class HeadlessGame:
+    def __init__(self, bot, world, game_step=8):
+        self.bot = bot
+        self.world = world
+        self.client = HeadlessClient(world, game_step)
+        self.step_times = []
+
+    async def start(self):
+        bot, client = self.bot, self.client
+        bot._initialize_variables()
+        game_data = await client.get_game_data()
+        game_info = await client.get_game_info()
+        bot._prepare_start(client, 1, game_info, game_data)
+        await self.observe()
+        await bot.on_before_start()
+        bot._prepare_first_step()
+        await bot.on_start()
+
+    async def observe(self):
+        state = await self.client.observation()
+        proto_game_info = await self.client._execute(game_info=sc_pb.RequestGameInfo())
+        self.bot._prepare_step(GameState(state.observation), proto_game_info)
+
+    async def step(self, iteration):
+        await self.bot.issue_events()
+        started = time.perf_counter()
+        await self.bot.on_step(iteration)
+        self.step_times.append(time.perf_counter() - started)
+        await self.bot._after_step()
+        await self.client.step()
+        await self.observe()
+
+    async def play(self, steps):
+        await self.start()
+        for iteration in range(steps):
+            await self.step(iteration)
+        return self.step_times
+
+
+# Synthetic mid-game state: our bases, workers, production and army against an enemy army near our natural
+def make_scenario(phase="mid", unit_count=200, seed=0):
+    rng = random.Random(seed)
+    world = HeadlessWorld()
+    minutes = {"early": 2, "mid": 8, "late": 16}[phase]
+    world.game_loop = int(minutes * 60 * 22.4)
+    world.minerals, world.vespene = 400 * minutes, 150 * minutes
+
+    own_bases = [(30.5, 30.5), (30.5, 64.5), (64.5, 30.5)][:{"early": 1, "mid": 2, "late": 3}[phase]]
+    for x, y in [(30.5, 30.5), (30.5, 64.5), (64.5, 30.5), (97.5, 97.5), (97.5, 63.5), (63.5, 97.5)]:
+        world.add_base(x, y, owner=SELF if (x, y) in own_bases else (ENEMY if (x, y) == (97.5, 97.5) else None))
+
+    def free_spot(x, y, spread):
+        return x + rng.uniform(-spread, spread), y + rng.uniform(-spread, spread)
+
+    # Production buildings and depots in a grid behind the main mineral line
+    structures = {"early": [UnitTypeId.SUPPLYDEPOT, UnitTypeId.BARRACKS],
+                  "mid": [UnitTypeId.SUPPLYDEPOT] * 6 + [UnitTypeId.BARRACKS] * 4 + [
+                      UnitTypeId.FACTORY, UnitTypeId.STARPORT, UnitTypeId.ENGINEERINGBAY],
+                  "late": [UnitTypeId.SUPPLYDEPOT] * 14 + [UnitTypeId.BARRACKS] * 5 + [UnitTypeId.FACTORY] * 2 + [
+                      UnitTypeId.STARPORT] * 2 + [UnitTypeId.ENGINEERINGBAY, UnitTypeId.ARMORY]}[phase]
+    for index, structure in enumerate(structures):
+        x, y = 40 + (index % 6) * 4, 40 + (index // 6) * 4
+        world.add_unit(structure, SELF, x, y)
+
+    workers = min(12 * len(own_bases), unit_count // 3)
+    enemies = unit_count // 3 if phase != "early" else unit_count // 10
+    army = max(unit_count - workers - enemies, 0)
+    for i in range(workers):
+        x, y = own_bases[i % len(own_bases)]
+        world.add_unit(UnitTypeId.SCV, SELF, *free_spot(x, y, 5))
+    for i in range(army):
+        world.add_unit(rng.choice(ARMY_TYPES), SELF, *free_spot(45, 45, 8))
+    # The enemy is pushing towards our natural in the later phases and idling at home early on
+    enemy_center = (97, 97) if phase == "early" else (52, 60)
+    for i in range(enemies):
+        world.add_unit(rng.choice(ARMY_TYPES), ENEMY, *free_spot(*enemy_center, 8))
+    return world
@@ -0,0 +1,156 @@
+import numpy as np
+
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.position import Point2
+
+from combat_sim import UnitTypeStats
+from snapshot import VISIBLE
+
+GROUND, AIR, FRIENDLY = 0, 1, 2
+WORKER_TYPES = {UnitTypeId.SCV, UnitTypeId.PROBE, UnitTypeId.DRONE, UnitTypeId.MULE}
+
+
+# Grid of enemy ground threat, enemy air threat and friendly control in dps per cell. Every armed unit stamps a
+# disc of its weapon range onto the grid; each step only units that changed cell (or appeared, died or left
+# vision) are re-stamped, so lookups are single array reads.
+class InfluenceMap:
+    THREAT_MARGIN = 2  # Cells added to weapon ranges, roughly the distance a unit closes before it fires
+    SAFE_THREAT = 0.5  # Influence below this counts as none; stamps are added and removed as floats
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.layers = None
+        self.pathable = None
+        self.stamps = {}  # tag -> tuple of (layer, x, y, radius, weight) currently on the grid
+        self.kernels = {}
+        self.templates = {}
+
+    def setup(self):
+        self.pathable = self.bot.game_info.pathing_grid.data_numpy.astype(bool)
+        self.layers = np.zeros((3,) + self.pathable.shape, dtype=np.float64)
+        self.stamps.clear()
+
+    @property
+    def ground_threat(self):
+        return self.layers[GROUND]
+
+    @property
+    def air_threat(self):
+        return self.layers[AIR]
+
+    @property
+    def control(self):
+        return self.layers[FRIENDLY]
+
+    # Disc of ones with the given integer radius
+    def kernel(self, radius):
+        kernel = self.kernels.get(radius)
+        if kernel is None:
+            offsets = np.arange(-radius, radius + 1)
+            kernel = self.kernels[radius] = (
+                (offsets[None, :] ** 2 + offsets[:, None] ** 2) <= radius ** 2).astype(np.float64)
+        return kernel
+
+    def stamp(self, layer, x, y, radius, weight):
+        height, width = self.pathable.shape
+        left, right = max(x - radius, 0), min(x + radius + 1, width)
+        bottom, top = max(y - radius, 0), min(y + radius + 1, height)
+        if left >= right or bottom >= top:
+            return
+        kernel = self.kernel(radius)[bottom - y + radius:top - y + radius, left - x + radius:right - x + radius]
+        self.layers[layer, bottom:top, left:right] += kernel * weight
+
+    # (layer, radius, dps) of every stamp a unit type puts on the grid, worked out once per type and side
+    def stamp_template(self, unit, own):
+        key = (unit._proto.unit_type, own)
+        template = self.templates.get(key)
+        if template is None:
+            stats = UnitTypeStats(unit)
+            # Our units only count once towards control, enemies threaten ground and air separately
+            if own:
+                weapons = ((FRIENDLY, stats.ground or stats.air),)
+            else:
+                weapons = ((GROUND, stats.ground), (AIR, stats.air))
+            template = self.templates[key] = tuple(
+                (layer, int(np.ceil(weapon[3] + unit.radius + self.THREAT_MARGIN)),
+                 weapon[0] * weapon[1] / max(weapon[2], 0.1))
+                for layer, weapon in weapons if weapon is not None
+            )
+        return template
+
+    # Stamps a unit at (x, y) should have on the grid right now
+    def stamps_for(self, unit, own, x, y):
+        template = self.stamp_template(unit, own)
+        if not template:
+            return ()
+        x, y = int(x), int(y)
+        return tuple((layer, x, y, radius, weight) for layer, radius, weight in template)
+
+    def update(self):
+        snapshot = self.bot.snapshot
+        # Snapshots of fogged structures keep their threat; units out of vision drop theirs. Workers are left out
+        tables = (
+            (snapshot.enemy_units, False, snapshot.enemy_units.mask(flags=VISIBLE)),
+            (snapshot.enemy_structures, False, snapshot.enemy_structures.mask()),
+            (snapshot.units, True, ~snapshot.units.mask(WORKER_TYPES)),
+            (snapshot.structures, True, snapshot.structures.mask()),
+        )
+        current = {}
+        for table, own, mask in tables:
+            index = np.flatnonzero(mask)
+            rows = table.rows[index]
+            for i, tag, (x, y) in zip(index.tolist(), rows["tag"].tolist(), rows["position"].tolist()):
+                current[tag] = self.stamps_for(table.units[i], own, x, y)
+
+        for tag, stamps in self.stamps.items():
+            if current.get(tag) != stamps:
+                for layer, x, y, radius, weight in stamps:
+                    self.stamp(layer, x, y, radius, -weight)
+        for tag, stamps in current.items():
+            if self.stamps.get(tag) != stamps:
+                for layer, x, y, radius, weight in stamps:
+                    self.stamp(layer, x, y, radius, weight)
+        self.stamps = current
+
+    def cell(self, position):
+        height, width = self.pathable.shape
+        return min(max(int(position[1]), 0), height - 1), min(max(int(position[0]), 0), width - 1)
+
+    def ground_threat_at(self, position):
+        return float(self.layers[(GROUND,) + self.cell(position)])
+
+    def air_threat_at(self, position):
+        return float(self.layers[(AIR,) + self.cell(position)])
+
+    def control_at(self, position):
+        return float(self.layers[(FRIENDLY,) + self.cell(position)])
+
+    def is_safe(self, position, air=False):
+        return (self.air_threat_at(position) if air else self.ground_threat_at(position)) < self.SAFE_THREAT
+
+    # Pathable cell within the radius with the least ground threat, preferring cells close to the position
+    def safest_cell_near(self, position, radius=10):
+        row, column = self.cell(position)
+        height, width = self.pathable.shape
+        bottom, top = max(row - radius, 0), min(row + radius + 1, height)
+        left, right = max(column - radius, 0), min(column + radius + 1, width)
+        threat = self.layers[GROUND, bottom:top, left:right]
+        rows, columns = np.ogrid[bottom:top, left:right]
+        distance = np.hypot(rows - row, columns - column)
+        # Threat dominates, distance only breaks ties between equally safe cells
+        score = np.where(self.pathable[bottom:top, left:right] & (distance <= radius),
+                         np.floor(threat / self.SAFE_THREAT) * (2 * radius + 1) + distance, np.inf)
+        best = np.unravel_index(np.argmin(score), score.shape)
+        if not np.isfinite(score[best]):
+            return Point2(position)
+        return Point2((left + int(best[1]) + 0.5, bottom + int(best[0]) + 0.5))
+
+    # Contested cell where enemy ground threat exceeds our control the most, or None if nothing is contested
+    def weakest_frontier(self):
+        ground, control = self.layers[GROUND], self.layers[FRIENDLY]
+        contested = (ground >= self.SAFE_THREAT) & (control >= self.SAFE_THREAT)
+        if not contested.any():
+            return None
+        pressure = np.where(contested, ground - control, -np.inf)
+        row, column = np.unravel_index(np.argmax(pressure), pressure.shape)
+        return Point2((int(column) + 0.5, int(row) + 0.5))
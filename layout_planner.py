@@ -0,0 +1,142 @@
+import numpy as np
+
+from sc2.ids.unit_typeid import UnitTypeId
+from sc2.position import Point2
+
+DEPOT_TYPES = {UnitTypeId.SUPPLYDEPOT}
+# 3x3 buildings all get room for an add-on so any of them can be swapped for production later
+LARGE_TYPES = {UnitTypeId.BARRACKS, UnitTypeId.FACTORY, UnitTypeId.STARPORT, UnitTypeId.ENGINEERINGBAY,
+               UnitTypeId.ARMORY, UnitTypeId.BUNKER, UnitTypeId.GHOSTACADEMY, UnitTypeId.FUSIONCORE}
+
+FREE, PENDING, USED, SUSPECT, CHECKING, BLOCKED = "free", "pending", "used", "suspect", "checking", "blocked"
+
+
+class BuildingSlot:
+    def __init__(self, position, large):
+        self.position = position  # Center of the building
+        self.large = large
+        self.state = FREE
+        self.since = 0  # Game loop of the last state change
+
+
+# Reserves building slots around each base from the placement grid once, then hands them out from a local free
+# list. Large slots keep the 2x2 add-on spot to their right clear, and every slot keeps a one cell lane around it so
+# units never get walled in. The server is only asked about a slot after it failed to produce a building.
+class LayoutPlanner:
+    LARGE_SLOTS = 16
+    DEPOT_SLOTS = 24
+    SEARCH_DISTANCE = 22  # Ground distance from the base within which slots are laid out
+    PENDING_TIMEOUT = 22.4 * 20  # Game loops a handed out slot may stay empty before it is suspected blocked
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.map_analysis = None
+        self.buildable = None
+        self.core = None  # Cells covered by a reserved building or add-on
+        self.lanes = None  # Cells kept free around reserved slots
+        self.slots = {}  # base index -> list of BuildingSlot, closest to the base first
+        self.server_checks = 0
+
+    def setup(self, map_analysis):
+        self.map_analysis = map_analysis
+        pathable = self.bot.game_info.pathing_grid.data_numpy.astype(bool)
+        self.buildable = np.asarray(map_analysis.buildable) & pathable
+        self.core = np.zeros(self.buildable.shape, dtype=bool)
+        self.lanes = np.zeros(self.buildable.shape, dtype=bool)
+        self.slots.clear()
+
+    # Slots of the base nearest to the position, laid out the first time the base is asked for
+    def slots_for(self, position):
+        base = self.map_analysis.base_index(position)
+        slots = self.slots.get(base)
+        if slots is None:
+            slots = self.slots[base] = self.lay_out(base)
+        return slots
+
+    def lay_out(self, base):
+        distance = np.asarray(self.map_analysis.distance_fields[base])
+        rows, columns = np.nonzero(distance <= self.SEARCH_DISTANCE)
+        order = np.argsort(distance[rows, columns], kind="stable")
+        slots = []
+        # Large slots first: they need the most room and should sit closest to the base
+        for large, wanted in ((True, self.LARGE_SLOTS), (False, self.DEPOT_SLOTS)):
+            found = 0
+            for i in order:
+                if found == wanted:
+                    break
+                position = self.reserve(int(columns[i]), int(rows[i]), large)
+                if position is not None:
+                    slots.append(BuildingSlot(position, large))
+                    found += 1
+        return slots
+
+    # Reserve the block with its bottom left cell at (x, y) if it fits; returns the building center
+    def reserve(self, x, y, large):
+        size = 3 if large else 2
+        width = 5 if large else 2  # Building plus add-on
+        height, map_width = self.buildable.shape
+        if x < 1 or y < 1 or x + width + 1 > map_width or y + size + 1 > height:
+            return None
+        block = (slice(y, y + size), slice(x, x + width))
+        ring = (slice(y - 1, y + size + 1), slice(x - 1, x + width + 1))
+        if not self.buildable[block].all() or self.core[ring].any() or self.lanes[block].any():
+            return None
+        self.core[block] = True
+        self.lanes[ring] = True
+        return Point2((x + size / 2, y + size / 2))
+
+    # Next free slot for the building near the position, or None if the base has run out of slots
+    async def take(self, building_type, position):
+        if building_type not in DEPOT_TYPES and building_type not in LARGE_TYPES:
+            return None
+        self.refresh()
+        large = building_type in LARGE_TYPES
+        for slot in self.slots_for(position):
+            if slot.large != large or slot.state not in {FREE, SUSPECT}:
+                continue
+            if slot.state == SUSPECT:
+                # Something kept the last building from starting here; let the server decide if it is still usable.
+                # Managers run concurrently, so the slot is held while the query is out and no one else checks it.
+                self.mark(slot, CHECKING)
+                self.server_checks += 1
+                usable = None
+                try:
+                    usable = await self.bot.queries.placement(building_type, slot.position)
+                finally:
+                    # A check that never came back leaves the slot suspect for the next builder
+                    self.mark(slot, SUSPECT if usable is None else PENDING if usable else BLOCKED)
+                if not usable:
+                    continue
+                return slot.position
+            self.mark(slot, PENDING)
+            return slot.position
+        return None
+
+    # Give back a slot that was taken but not built on
+    def release(self, position):
+        for slots in self.slots.values():
+            for slot in slots:
+                if slot.state == PENDING and slot.position == position:
+                    self.mark(slot, FREE)
+                    return
+
+    def mark(self, slot, state):
+        slot.state = state
+        slot.since = self.bot.state.game_loop
+
+    # Track what happened to handed out slots using the structures the bot can see
+    def refresh(self):
+        game_loop = self.bot.state.game_loop
+        for slots in self.slots.values():
+            for slot in slots:
+                # A slot being checked is settled by the builder that is checking it
+                if slot.state in {FREE, CHECKING, BLOCKED}:
+                    continue
+                occupied = self.bot.structures_index.exists_within(1.0, slot.position)
+                if slot.state in {PENDING, SUSPECT} and occupied:
+                    self.mark(slot, USED)
+                elif slot.state == USED and not occupied:
+                    # The building was destroyed or lifted off; the spot may have been taken over since
+                    self.mark(slot, SUSPECT)
+                elif slot.state == PENDING and game_loop - slot.since > self.PENDING_TIMEOUT:
+                    self.mark(slot, SUSPECT)
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from sc2.position import Point2
+
+MAP_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "map_cache")
+
+
+# Cell ids of the pathable cells (-1 elsewhere) and the edges of the 8-connected grid between them as
+# (source ids, target ids, lengths), each edge listed once
+def pathing_edges(pathable):
+    height, width = pathable.shape
+    cell_ids = np.full(pathable.shape, -1, dtype=np.int64)
+    cell_ids[pathable] = np.arange(pathable.sum())
+    rows, columns, weights = [], [], []
+    for dy, dx, weight in ((0, 1, 1.0), (1, 0, 1.0), (1, 1, np.sqrt(2)), (1, -1, np.sqrt(2))):
+        source = cell_ids[:height - dy, max(-dx, 0):width - max(dx, 0)]
+        target = cell_ids[dy:, max(dx, 0):width - max(-dx, 0)]
+        connected = (source >= 0) & (target >= 0)
+        rows.append(source[connected])
+        columns.append(target[connected])
+        weights.append(np.full(connected.sum(), weight))
+    return cell_ids, np.concatenate(rows), np.concatenate(columns), np.concatenate(weights)
+
+
+# (row, column) of the pathable cell closest to the position
+def nearest_pathable_cell(pathable, position):
+    x, y = int(position[0]), int(position[1])
+    height, width = pathable.shape
+    if 0 <= x < width and 0 <= y < height and pathable[y, x]:
+        return y, x
+    pathable_cells = np.argwhere(pathable)
+    row, column = pathable_cells[np.argmin(((pathable_cells - [position[1], position[0]]) ** 2).sum(axis=1))]
+    return int(row), int(column)
+
+
+# Map-derived data that only depends on the map: expansion locations, ground distances between them, the cells
+# we may build on and a ground distance field from every base. Computed once per map and kept on disk as raw
+# .npy arrays that later games memory-map instead of recomputing.
+class MapAnalysis:
+    CACHE_VERSION = 1  # Bump when the analysis changes so old caches are rebuilt
+    EXPANSION_CLEARANCE = 7  # Cells around expansion locations kept free for townhalls and mining
+    ARRAYS = ("expansions", "base_distances", "buildable", "distance_fields")
+
+    def __init__(self, expansions, base_distances, buildable, distance_fields):
+        self.expansions = expansions  # (bases, 2) expansion locations
+        self.base_distances = base_distances  # (bases, bases) ground distance between expansion locations
+        self.buildable = buildable  # (height, width) placeable cells outside the expansion clearances
+        self.distance_fields = distance_fields  # (bases, height, width) ground distance from each base, or inf
+
+    @staticmethod
+    def cache_key(game_info):
+        digest = hashlib.sha1(str(MapAnalysis.CACHE_VERSION).encode())
+        for grid in (game_info.pathing_grid, game_info.placement_grid, game_info.terrain_height):
+            digest.update(np.ascontiguousarray(grid.data_numpy).tobytes())
+        return digest.hexdigest()
+
+    @classmethod
+    def load_or_build(cls, bot, cache_dir=MAP_CACHE_DIR):
+        path = os.path.join(cache_dir, cls.cache_key(bot.game_info))
+        if os.path.isdir(path):
+            try:
+                return cls.load(path)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable map cache {path}: {e}")
+        analysis = cls.build(bot)
+        try:
+            analysis.save(path)
+        except OSError as e:
+            print(f"Could not write map cache {path}: {e}")
+        return analysis
+
+    @classmethod
+    def load(cls, path):
+        return cls(*(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in cls.ARRAYS))
+
+    # Write to a temporary directory first so parallel games never see a half written cache
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = tempfile.mkdtemp(dir=os.path.dirname(path))
+        try:
+            for name in self.ARRAYS:
+                np.save(os.path.join(staging, f"{name}.npy"), getattr(self, name))
+            os.rename(staging, path)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+
+    @classmethod
+    def build(cls, bot):
+        pathable = bot.game_info.pathing_grid.data_numpy.astype(bool)
+        placeable = bot.game_info.placement_grid.data_numpy.astype(bool)
+        expansions = np.array([position for position in bot.expansion_locations_list], dtype=np.float32)
+        height, width = pathable.shape
+
+        # Ground distance from every base over an 8-connected grid of the pathable cells
+        cell_ids, rows, columns, weights = pathing_edges(pathable)
+        graph = coo_matrix((weights, (rows, columns)), shape=(pathable.sum(),) * 2).tocsr()
+
+        # Expansion locations sit under (future) townhalls, so start from the nearest pathable cell
+        sources = [cell_ids[nearest_pathable_cell(pathable, (x, y))] for x, y in expansions]
+        distances = dijkstra(graph, directed=False, indices=sources) if sources else np.empty((0, graph.shape[0]))
+        distance_fields = np.full((len(expansions), height, width), np.inf, dtype=np.float32)
+        distance_fields[:, pathable] = distances
+        base_distances = distances[:, sources].astype(np.float32)
+
+        # Keep townhall spots and mineral lines free of buildings
+        buildable = placeable.copy()
+        ys, xs = np.mgrid[0:height, 0:width]
+        for x, y in expansions:
+            buildable &= (xs + 0.5 - x) ** 2 + (ys + 0.5 - y) ** 2 >= cls.EXPANSION_CLEARANCE ** 2
+
+        return cls(expansions, base_distances, buildable, distance_fields)
+
+    # Index of the expansion location closest to the position
+    def base_index(self, position):
+        return int(np.argmin(((self.expansions - [position[0], position[1]]) ** 2).sum(axis=1)))
+
+    # Ground distance from the given base to a position, inf if it cannot be reached
+    def ground_distance(self, base, position):
+        height, width = self.buildable.shape
+        x = min(max(int(position[0]), 0), width - 1)
+        y = min(max(int(position[1]), 0), height - 1)
+        return float(self.distance_fields[base, y, x])
+
+    # Expansion locations ordered by ground distance from the base nearest to the position
+    def expansions_by_distance(self, position):
+        distances = self.base_distances[self.base_index(position)]
+        return [Point2(self.expansions[i].tolist()) for i in np.argsort(distances, kind="stable")
+                if np.isfinite(distances[i])]
@@ -0,0 +1,150 @@
+import csv
+import functools
+import inspect
+import json
+import os
+import time
+import weakref
+from collections import defaultdict
+
+import numpy as np
+
+from sc2.units import Units
+
+
+# Opt-in instrumentation of the bot's coroutines. Nothing is wrapped unless the profiler is enabled,
+# so a disabled profiler costs nothing at runtime.
+class Profiler:
+    # Units methods that walk the whole collection; their input size is counted as "units scanned"
+    SCANNING_METHODS = (
+        "filter", "of_type", "exclude_type", "closer_than", "further_than", "closest_to", "furthest_to",
+        "closest_distance_to", "in_attack_range_of", "sorted_by_distance_to",
+    )
+    # Coroutines that are plumbing rather than managers
+    SKIPPED_COROUTINES = {"on_start", "on_end", "run_manager"}
+
+    def __init__(self, output_dir=None):
+        self.output_dir = output_dir
+        self.enabled = output_dir is not None
+        self.queries = 0
+        self.units_scanned = 0
+        # (manager, game minute) -> list of (wall time, queries, actions, units scanned)
+        self.samples = defaultdict(list)
+        self._patched_units_methods = {}
+        self._restore_units = None
+
+    # Replace every coroutine of the bot instance with a measuring wrapper
+    def instrument(self, bot):
+        if not self.enabled:
+            return
+        for name, member in inspect.getmembers(type(bot)):
+            if name in self.SKIPPED_COROUTINES or not inspect.iscoroutinefunction(member):
+                continue
+            # Only the bot's own coroutines, not the python-sc2 BotAI API
+            if member.__module__.startswith("sc2"):
+                continue
+            setattr(bot, name, self.wrap(bot, getattr(bot, name)))
+
+    # Count server round trips; the client only exists once the game has started
+    def instrument_client(self, client):
+        if not self.enabled:
+            return
+        execute = client._execute
+
+        @functools.wraps(execute)
+        async def counting_execute(*args, **kwargs):
+            self.queries += 1
+            return await execute(*args, **kwargs)
+
+        client._execute = counting_execute
+
+    def wrap(self, bot, coroutine):
+        @functools.wraps(coroutine)
+        async def measured(*args, **kwargs):
+            queries, scanned, actions = self.queries, self.units_scanned, len(bot.actions)
+            started = time.perf_counter()
+            try:
+                return await coroutine(*args, **kwargs)
+            finally:
+                self.samples[(coroutine.__name__, int(bot.minutes_passed))].append((
+                    time.perf_counter() - started,
+                    self.queries - queries,
+                    max(len(bot.actions) - actions, 0),
+                    self.units_scanned - scanned,
+                ))
+
+        return measured
+
+    # Count the units scanned by Units methods; called when the game starts. The patch is process wide, so it is
+    # undone in dump() or, for a game that never got there, when the profiler is garbage collected.
+    def patch_units(self):
+        if not self.enabled or self._patched_units_methods:
+            return
+        profiler = weakref.ref(self)  # The patched methods must not keep the profiler alive
+        counted = [name for name in self.SCANNING_METHODS
+                   if getattr(getattr(Units, name), "counted_by_profiler", False)]
+        if counted:
+            print(f"Units methods already counted by another profiler, not counting them twice: {', '.join(counted)}")
+        for name in self.SCANNING_METHODS:
+            original = getattr(Units, name)
+            if name in counted:
+                continue
+            self._patched_units_methods[name] = original
+
+            def counting(units, *args, _original=original, **kwargs):
+                active = profiler()
+                if active is not None:
+                    active.units_scanned += len(units)
+                return _original(units, *args, **kwargs)
+
+            counting = functools.wraps(original)(counting)
+            counting.counted_by_profiler = True
+            setattr(Units, name, counting)
+        self._restore_units = weakref.finalize(self, restore_units_methods, dict(self._patched_units_methods))
+
+    def unpatch_units(self):
+        if self._restore_units is not None:
+            self._restore_units()
+            self._restore_units = None
+        self._patched_units_methods.clear()
+
+    # Per-manager, per-minute wall time percentiles plus totals of the other counters
+    def summary(self):
+        rows = []
+        for (manager, minute), samples in sorted(self.samples.items()):
+            data = np.array(samples, dtype=float)
+            wall_ms = data[:, 0] * 1000
+            p50, p95, p99 = np.percentile(wall_ms, [50, 95, 99])
+            rows.append({
+                "manager": manager,
+                "minute": minute,
+                "calls": len(samples),
+                "p50_ms": round(float(p50), 4),
+                "p95_ms": round(float(p95), 4),
+                "p99_ms": round(float(p99), 4),
+                "max_ms": round(float(wall_ms.max()), 4),
+                "queries": int(data[:, 1].sum()),
+                "actions": int(data[:, 2].sum()),
+                "units_scanned": int(data[:, 3].sum()),
+            })
+        return rows
+
+    def dump(self):
+        if not self.enabled:
+            return
+        try:
+            rows = self.summary()
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(os.path.join(self.output_dir, "profile.json"), "w") as f:
+                json.dump(rows, f, indent=2)
+            with open(os.path.join(self.output_dir, "profile.csv"), "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["manager"])
+                writer.writeheader()
+                writer.writerows(rows)
+        finally:
+            self.unpatch_units()
+
+
+def restore_units_methods(originals):
+    for name, original in originals.items():
+        setattr(Units, name, original)
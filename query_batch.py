@@ -0,0 +1,114 @@
+import asyncio
+
+from s2clientprotocol import query_pb2 as query_pb
+
+from sc2.ids.ability_id import AbilityId
+from sc2.position import Point2
+from sc2.unit import Unit
+
+PATHING, PLACEMENT, ABILITIES = "pathing", "placements", "abilities"
+
+
+# Collects the pathing, placement and available-ability questions of everything that is running concurrently and
+# answers them with one query request per round. Callers await a future; the first question of a round schedules
+# the flush, which waits until every other runnable coroutine had the chance to add its questions.
+class QueryCollector:
+    RINGS_PER_ROUND = 4  # Placement search rings asked together; more rings means fewer rounds but more queries
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.pending = []  # (kind, request, ignore_resources, future)
+        self.flush_task = None
+        self.rounds = 0
+        self.queries = 0
+
+    def submit(self, kind, request, ignore_resources):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((kind, request, ignore_resources, future))
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush())
+        return future
+
+    # Ground distance between two points (or from a unit), None if there is no path
+    def pathing(self, start, end):
+        request = query_pb.RequestQueryPathing(end_pos=Point2(end).as_Point2D)
+        if isinstance(start, Unit):
+            request.unit_tag = start.tag
+        else:
+            request.start_pos.CopyFrom(Point2(start).as_Point2D)
+        return self.submit(PATHING, request, ignore_resources=False)
+
+    # True if the building can be placed at the position, resources aside
+    def placement(self, building_type, position):
+        ability = self.bot.game_data.units[building_type.value].creation_ability.id
+        request = query_pb.RequestQueryBuildingPlacement(ability_id=ability.value,
+                                                         target_pos=Point2(position).as_Point2D)
+        return self.submit(PLACEMENT, request, ignore_resources=True)
+
+    # Abilities the unit can use right now
+    def abilities(self, unit, ignore_resources=False):
+        request = query_pb.RequestQueryAvailableAbilities(unit_tag=unit.tag)
+        return self.submit(ABILITIES, request, ignore_resources)
+
+    # Same ring search as BotAI.find_placement, but several rings are asked in the same round instead of one round
+    # per ring; the first band with a valid position wins
+    async def find_placement(self, building_type, near, max_distance=20, placement_step=2):
+        near = Point2(near)
+        if await self.placement(building_type, near):
+            return near
+        rings = []
+        for distance in range(placement_step, max_distance, placement_step):
+            rings.append([near.offset(offset) for offset in (
+                [(dx, -distance) for dx in range(-distance, distance + 1, placement_step)]
+                + [(dx, distance) for dx in range(-distance, distance + 1, placement_step)]
+                + [(-distance, dy) for dy in range(-distance + placement_step, distance, placement_step)]
+                + [(distance, dy) for dy in range(-distance + placement_step, distance, placement_step)]
+            )])
+        for band in range(0, len(rings), self.RINGS_PER_ROUND):
+            candidates = [position for ring in rings[band:band + self.RINGS_PER_ROUND] for position in ring]
+            results = await asyncio.gather(*(self.placement(building_type, position) for position in candidates))
+            valid = [position for position, ok in zip(candidates, results) if ok]
+            if valid:
+                return min(valid, key=near.distance_to_point2)
+        return None
+
+    async def flush(self):
+        # Let every coroutine that is ready to run add its questions to this round first
+        await asyncio.sleep(0)
+        batch, self.pending, self.flush_task = self.pending, [], None
+        self.rounds += 1
+        self.queries += len(batch)
+
+        # The resource flag is per request, so a round is at most two requests sent concurrently
+        groups = {}
+        for entry in batch:
+            groups.setdefault(entry[2], []).append(entry)
+        try:
+            responses = await asyncio.gather(*(self.send(flag, entries) for flag, entries in groups.items()))
+        except Exception as e:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for entries, response in zip(groups.values(), responses):
+            answers = {PATHING: iter(response.pathing), PLACEMENT: iter(response.placements),
+                       ABILITIES: iter(response.abilities)}
+            for kind, _, _, future in entries:
+                answer = next(answers[kind])
+                if future.done():
+                    continue
+                if kind == PATHING:
+                    future.set_result(answer.distance or None)
+                elif kind == PLACEMENT:
+                    future.set_result(answer.result == 1)  # ActionResult.Success
+                else:
+                    future.set_result([AbilityId(ability.ability_id) for ability in answer.abilities
+                                       if ability.ability_id in AbilityId._value2member_map_])
+
+    async def send(self, ignore_resources, entries):
+        request = query_pb.RequestQuery(ignore_resource_requirements=ignore_resources)
+        for kind, item, _, _ in entries:
+            getattr(request, kind).add().CopyFrom(item)
+        response = await self.bot.client._execute(query=request)
+        return response.query
@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import queue
+import sys
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+
+# Runs a matrix of maps x opponent races x difficulties, one game per worker process, and appends one JSON line
+# per game to a results file.
+#
+#   python runner.py --maps sc2-ai-cup-2022 --races terran zerg protoss --difficulties Hard VeryHard --workers 4
+#   python runner.py --backend headless --workers 8   # exercise the runner without a StarCraft II client
+#   python runner.py --telemetry-dir telemetry        # also record per-step telemetry, see telemetry.load_all
+
+
+# Wrap the bot's on_step so every step's wall time is recorded
+def record_step_times(bot):
+    step_times = []
+    on_step = bot.on_step
+
+    async def timed_on_step(iteration):
+        started = time.perf_counter()
+        try:
+            return await on_step(iteration)
+        finally:
+            step_times.append(time.perf_counter() - started)
+
+    bot.on_step = timed_on_step
+    return step_times
+
+
+def play_sc2(job):
+    from sc2 import maps
+    from sc2.data import Difficulty, Race
+    from sc2.main import run_game
+    from sc2.player import Bot, Computer
+
+    from StarCraftBot import StarCraftBot
+
+    bot = StarCraftBot(telemetry_dir=job["telemetry_dir"])
+    step_times = record_step_times(bot)
+    result = run_game(
+        maps.get(job["map"]),
+        [Bot(Race.Terran, bot), Computer(Race[job["race"].capitalize()], Difficulty[job["difficulty"]])],
+        realtime=job["realtime"],
+        game_time_limit=job["game_time_limit"],
+    )
+    return result.name, bot.time, step_times
+
+
+def play_headless(job):
+    from headless import HeadlessGame, make_scenario
+    from StarCraftBot import StarCraftBot
+
+    bot = StarCraftBot(telemetry_dir=job["telemetry_dir"])
+    step_times = record_step_times(bot)
+    world = make_scenario("mid", seed=zlib.crc32(json.dumps(job, sort_keys=True).encode()))
+    start_time = world.game_loop / 22.4
+    steps = int((job["game_time_limit"] or 60) * 22.4 / 8)
+    asyncio.run(HeadlessGame(bot, world).play(steps))
+    bot.telemetry.close()
+    # The stand-in has no combat, so there is never a winner
+    return "Undecided", bot.time - start_time, step_times
+
+
+BACKENDS = {
+    "sc2": play_sc2,
+    "headless": play_headless,
+}
+
+
+def run_job(job, results):
+    try:
+        outcome, duration, step_times = BACKENDS[job["backend"]](job)
+        step_ms = np.array(step_times) * 1000 if step_times else np.zeros(1)
+        results.put(dict(job, result=outcome, duration=round(duration, 1),
+                         mean_step_ms=round(float(step_ms.mean()), 3),
+                         p99_step_ms=round(float(np.percentile(step_ms, 99)), 3)))
+    except Exception as e:
+        results.put(dict(job, result="Error", error=str(e)))
+
+
+def finished(job, **fields):
+    return dict(job, duration=None, mean_step_ms=None, p99_step_ms=None, **fields)
+
+
+def run_matrix(jobs, workers, timeout, output):
+    # A fresh interpreter per game: a crashing or hanging client only takes its own game down
+    context = multiprocessing.get_context("spawn")
+    pending = list(jobs)
+    running = []
+    summary = Counter()
+
+    with open(output, "a") as results_file:
+        def record(row):
+            results_file.write(json.dumps(row, separators=(",", ":")) + "\n")
+            results_file.flush()
+            summary[(row["race"], row["difficulty"], row["result"])] += 1
+            print(f"{row['map']} vs {row['race']} {row['difficulty']}: {row['result']}")
+
+        try:
+            while pending or running:
+                while pending and len(running) < workers:
+                    job = pending.pop(0)
+                    results = context.Queue()
+                    # Not daemonic: a daemonic game may not start the bot's analysis worker
+                    process = context.Process(target=run_job, args=(job, results))
+                    process.start()
+                    running.append((job, process, results, time.monotonic()))
+
+                still_running = []
+                for job, process, results, started in running:
+                    try:
+                        record(results.get_nowait())
+                        process.join()
+                        continue
+                    except queue.Empty:
+                        pass
+                    if not process.is_alive():
+                        record(finished(job, result="Crash", error=f"exit code {process.exitcode}"))
+                    elif time.monotonic() - started > timeout:
+                        process.terminate()
+                        process.join()
+                        record(finished(job, result="Timeout"))
+                    else:
+                        still_running.append((job, process, results, started))
+                running = still_running
+                time.sleep(0.5)
+        finally:
+            # Games are not daemonic, so they would outlive a runner that stops early
+            for _, process, _, _ in running:
+                process.terminate()
+                process.join()
+
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play StarCraftBot against a matrix of opponents in parallel")
+    parser.add_argument("--maps", nargs="+", default=["sc2-ai-cup-2022"])
+    parser.add_argument("--races", nargs="+", default=["terran"], choices=["terran", "zerg", "protoss", "random"])
+    parser.add_argument("--difficulties", nargs="+", default=["Hard"],
+                        help="python-sc2 Difficulty names, e.g. Medium Hard VeryHard CheatInsane")
+    parser.add_argument("--games", type=int, default=1, help="games per map/race/difficulty combination")
+    parser.add_argument("--workers", type=int, default=max(multiprocessing.cpu_count() // 2, 1))
+    parser.add_argument("--timeout", type=float, default=3600, help="wall-clock seconds before a game is killed")
+    parser.add_argument("--game-time-limit", type=int, help="game seconds after which the game ends in a tie")
+    parser.add_argument("--realtime", action="store_true")
+    parser.add_argument("--backend", default="sc2", choices=sorted(BACKENDS))
+    parser.add_argument("--output", default="results.jsonl")
+    parser.add_argument("--telemetry-dir", help="record per-step telemetry of every game below this directory")
+    args = parser.parse_args(argv)
+
+    jobs = [
+        {"map": map_name, "race": race, "difficulty": difficulty, "game": game, "backend": args.backend,
+         "realtime": args.realtime, "game_time_limit": args.game_time_limit, "telemetry_dir": args.telemetry_dir}
+        for map_name, race, difficulty, game in itertools.product(
+            args.maps, args.races, args.difficulties, range(args.games))
+    ]
+    summary = run_matrix(jobs, args.workers, args.timeout, args.output)
+
+    for (race, difficulty, result), count in sorted(summary.items()):
+        print(f"{race:>8} {difficulty:>12} {result:>10}: {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+from collections import defaultdict
+
+from sc2.ids.unit_typeid import UnitTypeId
+
+from base_registry import REFINERY_TYPES, TOWNHALL_TYPES
+
+
+# Keeps every mineral patch and refinery of our finished bases at its worker target. Assignments are remembered
+# per worker, so a step only deals with what changed: new, idle and dead workers, depleted patches and refineries,
+# and bases or refineries that came or went. Gather orders go out only to workers whose assignment changed.
+class WorkerSaturation:
+    PATCH_WORKERS = 2  # More than two workers on a patch barely mine more
+    REFINERY_WORKERS = 3
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.resources = {}  # mineral patch or refinery tag -> Unit, for the resources of our ready bases
+        self.capacity = {}  # resource tag -> workers it should get
+        self.assigned = defaultdict(set)  # resource tag -> worker tags
+        self.assignment = {}  # worker tag -> resource tag
+        self.unassigned = set()
+        self.townhalls = set()  # Townhall tags of the bases the resources belong to
+        self.dirty = True  # Resources have to be collected again
+        self.orders = 0
+
+    def setup(self):
+        self.unassigned.update(self.bot.registry.tags[UnitTypeId.SCV] - self.assignment.keys())
+        self.dirty = True
+
+    def worker_added(self, unit):
+        if unit.type_id == UnitTypeId.SCV:
+            self.unassigned.add(unit.tag)
+
+    def structure_changed(self, unit):
+        if unit.type_id in TOWNHALL_TYPES or unit.type_id in REFINERY_TYPES or unit.tag in self.townhalls:
+            self.dirty = True
+
+    def unit_destroyed(self, unit_tag):
+        resource = self.assignment.pop(unit_tag, None)
+        if resource is not None:
+            self.assigned[resource].discard(unit_tag)
+        self.unassigned.discard(unit_tag)
+        # A depleted patch, a destroyed refinery or a lost base
+        if unit_tag in self.resources or unit_tag in self.townhalls:
+            self.dirty = True
+
+    def release(self, worker_tag):
+        resource = self.assignment.pop(worker_tag)
+        self.assigned[resource].discard(worker_tag)
+        self.unassigned.add(worker_tag)
+
+    # Collect the resources of our ready bases and free the workers of the ones that are gone
+    def sync(self):
+        bot = self.bot
+        minerals = {mineral.tag: mineral for mineral in bot.mineral_field}
+        refineries = {refinery.tag: refinery for refinery in bot.gas_buildings.ready}
+        self.resources, self.capacity, self.townhalls = {}, {}, set()
+        for base in bot.bases.owned(ready=True):
+            self.townhalls.add(base.townhall)
+            for tag in base.minerals:
+                if tag in minerals:
+                    self.resources[tag] = minerals[tag]
+                    self.capacity[tag] = self.PATCH_WORKERS
+            for refinery in base.refineries.values():
+                if refinery in refineries and refineries[refinery].vespene_contents:
+                    self.resources[refinery] = refineries[refinery]
+                    self.capacity[refinery] = self.REFINERY_WORKERS
+        for resource in list(self.assigned):
+            if resource not in self.resources:
+                for worker in list(self.assigned[resource]):
+                    self.release(worker)
+                del self.assigned[resource]
+
+        # Move surplus workers to free slots, e.g. once a new base finishes
+        free = sum(max(capacity - len(self.assigned[tag]), 0) for tag, capacity in self.capacity.items())
+        for tag, capacity in self.capacity.items():
+            while free and len(self.assigned[tag]) > capacity:
+                self.release(next(iter(self.assigned[tag])))
+                free -= 1
+        self.dirty = False
+
+    def update(self):
+        # Refineries run dry without a unit event
+        if any(refinery.tag in self.resources and not refinery.vespene_contents
+               for refinery in self.bot.gas_buildings):
+            self.dirty = True
+        if self.dirty:
+            self.sync()
+        if not self.resources:
+            return
+
+        workers = self.bot.registry.units(UnitTypeId.SCV)
+        resend = []
+        for worker in workers.idle:
+            if worker.tag in self.assignment:
+                resend.append(worker)
+            else:
+                self.unassigned.add(worker.tag)
+        for worker in resend:
+            self.gather(worker, self.assignment[worker.tag])
+        if not self.unassigned:
+            return
+
+        # Only workers that are free or already mining are given a resource; builders and scouts wait
+        for worker in workers:
+            if worker.tag not in self.unassigned or not (worker.is_idle or worker.is_gathering or worker.is_returning):
+                continue
+            self.unassigned.discard(worker.tag)
+            # Keep a worker that already mines its own resource or one with room on it, without sending an order
+            target = worker.order_target
+            if target in self.resources and (self.assignment.get(worker.tag) == target
+                                             or len(self.assigned[target]) < self.capacity[target]):
+                self.assign(worker.tag, target)
+                continue
+            resource = self.best_resource(worker)
+            self.assign(worker.tag, resource)
+            self.gather(worker, resource)
+
+    # Refineries with room first, then the emptiest patch, the closest one among equally empty patches
+    def best_resource(self, worker):
+        position = worker.position
+
+        def score(tag):
+            free = self.capacity[tag] - len(self.assigned[tag])
+            is_patch = self.capacity[tag] == self.PATCH_WORKERS
+            return (free <= 0, is_patch, -free, self.resources[tag].distance_to(position))
+
+        return min(self.resources, key=score)
+
+    def assign(self, worker_tag, resource):
+        previous = self.assignment.get(worker_tag)
+        if previous is not None:
+            self.assigned[previous].discard(worker_tag)
+        self.assignment[worker_tag] = resource
+        self.assigned[resource].add(worker_tag)
+
+    def gather(self, worker, resource):
+        worker.gather(self.resources[resource])
+        self.orders += 1
@@ -0,0 +1,67 @@
+import time
+from collections import Counter
+
+
+class ScheduledTask:
+    def __init__(self, manager, priority, cadence, cost, start_minute, peaceful_only, critical):
+        self.manager = manager
+        self.name = manager.__name__
+        self.priority = priority  # Higher runs first and is deferred last
+        self.cadence = cadence  # Preferred number of steps between runs
+        self.cost = cost  # Estimated wall time in seconds, refined from measurements
+        self.start_minute = start_minute  # Game minute from which the task becomes active
+        self.peaceful_only = peaceful_only  # Skipped while the bot is defending
+        self.critical = critical  # Ignores the budget while the bot is under threat
+        self.last_run = None
+        self.deferred = 0  # Consecutive steps this task was due but postponed
+
+
+# Runs the bot's managers within a per-step wall-clock budget, deferring low-priority work when a step runs long
+class TickScheduler:
+    STEP_BUDGET = 0.035  # Seconds per step; a realtime game step is ~45 ms at 22.4 loops per second
+    COST_SMOOTHING = 0.2  # Weight of the latest measurement in the running cost estimate
+    MAX_DEFERRALS = 10  # A task postponed this many steps in a row runs regardless of the budget
+
+    def __init__(self, bot, budget=None):
+        self.bot = bot
+        self.budget = budget if budget is not None else self.STEP_BUDGET
+        self.tasks = []
+        self.step_start = time.perf_counter()
+        self.deferrals = Counter()
+
+    def register(self, manager, priority, cadence=1, cost=0.001, start_minute=0, peaceful_only=False,
+                 critical=False):
+        task = ScheduledTask(manager, priority, cadence, cost, start_minute, peaceful_only, critical)
+        self.tasks.append(task)
+        return task
+
+    # Mark the beginning of the step so work done before run_step counts against the budget too
+    def start_step(self):
+        self.step_start = time.perf_counter()
+
+    def is_due(self, task, iteration, under_threat):
+        if self.bot.minutes_passed < task.start_minute:
+            return False
+        if task.peaceful_only and under_threat:
+            return False
+        return task.last_run is None or iteration - task.last_run >= task.cadence
+
+    async def run_step(self, iteration, under_threat):
+        due = [task for task in self.tasks if self.is_due(task, iteration, under_threat)]
+        # Deferred tasks age upwards so low-priority work is postponed, never starved
+        due.sort(key=lambda task: task.priority + task.deferred, reverse=True)
+
+        for task in due:
+            elapsed = time.perf_counter() - self.step_start
+            over_budget = elapsed + task.cost > self.budget
+            if over_budget and not (task.critical and under_threat) and task.deferred < self.MAX_DEFERRALS:
+                task.deferred += 1
+                self.deferrals[task.name] += 1
+                continue
+
+            started = time.perf_counter()
+            await self.bot.run_manager(task.manager)
+            duration = time.perf_counter() - started
+            task.cost += self.COST_SMOOTHING * (duration - task.cost)
+            task.last_run = iteration
+            task.deferred = 0
@@ -0,0 +1,85 @@
+import numpy as np
+
+from sc2.ids.ability_id import AbilityId
+from sc2.ids.unit_typeid import UnitTypeId
+
+from snapshot import FLYING
+
+
+# Batched siege/unsiege decisions for every tank with hysteresis, so a mode change is only sent on a real transition
+class SiegeTankMicro:
+    SIEGED_RANGE = 13  # Crucio Shock Cannon range (edge to edge)
+    SIEGED_MIN_RANGE = 2  # Sieged tanks cannot hit anything closer than this
+    UNSIEGE_MARGIN = 2  # Extra range a sieged tank keeps covering before it considers packing up
+    UNSIEGE_DELAY = 45  # Game loops without a target before a sieged tank unsieges (~2 s)
+    MODE_COOLDOWN = 70  # Game loops between mode changes of the same tank (siege animation is ~3 s)
+
+    def __init__(self, bot):
+        self.bot = bot
+        # tag -> game loop of the last mode change command
+        self.last_transition = {}
+        # tag -> first game loop a sieged tank had nothing to shoot at
+        self.idle_since = {}
+
+    def step(self):
+        snapshot = self.bot.snapshot
+        tank_rows = snapshot.units.mask({UnitTypeId.SIEGETANK, UnitTypeId.SIEGETANKSIEGED})
+        if not tank_rows.any():
+            self.last_transition.clear()
+            self.idle_since.clear()
+            return
+
+        # Tanks only shoot ground targets, so flying units and lifted structures are ignored
+        tanks = snapshot.units.rows[tank_rows]
+        targets = np.concatenate([table.rows[table.mask(exclude=FLYING)]
+                                  for table in (snapshot.enemy_units, snapshot.enemy_structures)])
+
+        tank_list = list(snapshot.units.select(tank_rows))
+        sieged = tanks["type"] == UnitTypeId.SIEGETANKSIEGED.value
+        has_target = self.targets_in_band(tanks, targets, sieged)
+
+        game_loop = self.bot.state.game_loop
+        alive = set()
+        for tank, is_sieged, in_band in zip(tank_list, sieged, has_target):
+            alive.add(tank.tag)
+            if game_loop - self.last_transition.get(tank.tag, -self.MODE_COOLDOWN) < self.MODE_COOLDOWN:
+                continue
+
+            if not is_sieged:
+                self.idle_since.pop(tank.tag, None)
+                if in_band:
+                    tank(AbilityId.SIEGEMODE_SIEGEMODE)
+                    self.last_transition[tank.tag] = game_loop
+            elif in_band:
+                self.idle_since.pop(tank.tag, None)
+            else:
+                idle_since = self.idle_since.setdefault(tank.tag, game_loop)
+                if game_loop - idle_since >= self.UNSIEGE_DELAY:
+                    tank(AbilityId.UNSIEGE_UNSIEGE)
+                    self.last_transition[tank.tag] = game_loop
+                    del self.idle_since[tank.tag]
+
+        # Forget tanks that died
+        for state in (self.last_transition, self.idle_since):
+            for tag in [tag for tag in state if tag not in alive]:
+                del state[tag]
+
+    # For every tank, whether at least one target sits between the sieged minimum and maximum range; tanks and
+    # targets are snapshot rows
+    def targets_in_band(self, tanks, targets, sieged):
+        if not len(targets):
+            return np.zeros(len(tanks), dtype=bool)
+
+        tank_positions = tanks["position"]
+        tank_radii = tanks["radius"]
+        target_positions = targets["position"]
+        target_radii = targets["radius"]
+
+        # Edge-to-edge distance of every tank to every target (tanks x targets)
+        deltas = tank_positions[:, None, :] - target_positions[None, :, :]
+        gaps = np.sqrt((deltas ** 2).sum(axis=2)) - tank_radii[:, None] - target_radii[None, :]
+
+        # Sieged tanks keep a wider band before unsieging than unsieged tanks need before sieging
+        max_range = np.where(sieged, self.SIEGED_RANGE + self.UNSIEGE_MARGIN, self.SIEGED_RANGE)
+        in_band = (gaps >= self.SIEGED_MIN_RANGE) & (gaps <= max_range[:, None])
+        return in_band.any(axis=1)
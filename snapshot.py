@@ -0,0 +1,175 @@
+from operator import attrgetter
+
+import numpy as np
+
+from sc2.units import Units
+
+# Bits of the "flags" column
+IDLE = 1
+READY = 2
+FLYING = 4
+VISIBLE = 8
+
+UNIT_DTYPE = np.dtype([
+    ("tag", np.uint64),
+    ("type", np.uint32),
+    ("position", np.float64, (2,)),
+    ("radius", np.float32),
+    ("hp", np.float32),
+    ("hp_max", np.float32),
+    ("shield", np.float32),
+    ("shield_max", np.float32),
+    ("energy", np.float32),
+    ("contents", np.int32),  # Minerals or vespene left in a resource
+    ("flags", np.uint8),
+])
+
+
+# Columns copied straight from the protobuf unit field of the same name
+PROTO_COLUMNS = (("tag", "tag"), ("type", "unit_type"), ("radius", "radius"), ("hp", "health"),
+                 ("hp_max", "health_max"), ("shield", "shield"), ("shield_max", "shield_max"), ("energy", "energy"))
+
+
+# Fill the rows from the units' protobuf messages a column at a time, so the per-unit work happens in C (map,
+# attrgetter, np.fromiter) rather than in Python property access
+def fill_rows(rows, units):
+    count = len(units)
+    protos = list(map(attrgetter("_proto"), units))
+
+    def column(field, dtype=np.float64):
+        return np.fromiter(map(attrgetter(field), protos), dtype=dtype, count=count)
+
+    for name, field in PROTO_COLUMNS:
+        rows[name] = column(field, rows.dtype[name])
+    rows["position"][:, 0] = column("pos.x")
+    rows["position"][:, 1] = column("pos.y")
+    rows["contents"] = column("mineral_contents", np.int32) + column("vespene_contents", np.int32)
+    orders = np.fromiter(map(len, map(attrgetter("orders"), protos)), dtype=np.int32, count=count)
+    rows["flags"] = ((orders == 0) * IDLE | (column("build_progress") == 1) * READY
+                     | column("is_flying", bool) * FLYING | (column("display_type", np.int32) == 1) * VISIBLE)
+
+
+# One Units collection of a step as structured rows, row i describing units[i]
+class UnitTable:
+    def __init__(self, bot):
+        self.bot = bot
+        self.rows = np.zeros(0, dtype=UNIT_DTYPE)
+        self.units = []
+        self._groups = None  # unit type id -> (units, ready units), built on first use in a step
+
+    def __len__(self):
+        return len(self.units)
+
+    def set(self, units, rows):
+        self.units = units
+        self.rows = rows
+        self._groups = None
+
+    @property
+    def positions(self):
+        return self.rows["position"]
+
+    # Rows of the given types that have all the flags set and none of the excluded ones
+    def mask(self, types=None, flags=0, exclude=0):
+        if types is None:
+            mask = np.ones(len(self.rows), dtype=bool)
+        else:
+            # A comparison per type is several times faster than np.isin for the few types asked for at once
+            column = self.rows["type"]
+            mask = np.zeros(len(self.rows), dtype=bool)
+            for type_id in types:
+                mask |= column == type_id.value
+        if flags or exclude:
+            mask &= (self.rows["flags"] & (flags | exclude)) == flags
+        return mask
+
+    # Units of one type, or only the finished ones; all types are grouped in one pass on first use in a step
+    def of_type(self, type_id, ready=False):
+        if self._groups is None:
+            self._groups = {}
+            is_ready = (self.rows["flags"] & READY).astype(bool).tolist()
+            for unit, type_value, unit_ready in zip(self.units, self.rows["type"].tolist(), is_ready):
+                group = self._groups.get(type_value)
+                if group is None:
+                    group = self._groups[type_value] = ([], [])
+                group[0].append(unit)
+                if unit_ready:
+                    group[1].append(unit)
+        group = self._groups.get(type_id.value)
+        return group[ready] if group else []
+
+    def select(self, mask):
+        return Units([self.units[i] for i in np.flatnonzero(mask)], self.bot)
+
+    def first(self, mask):
+        hits = np.flatnonzero(mask)
+        return self.units[hits[0]] if hits.size else None
+
+
+# Columnar copy of everything the managers look at, taken in one pass at the start of each step. Own units,
+# structures, enemies and resources become structured arrays, so questions about health, energy, positions or
+# unit value across many units are answered with array expressions instead of property access per unit.
+class StateSnapshot:
+    INITIAL_ROWS = 1024
+    # Tables in buffer order; the first four are the units rows_of can find
+    TABLES = ("units", "structures", "enemy_units", "enemy_structures", "mineral_field", "vespene_geyser")
+
+    def __init__(self, bot):
+        self.bot = bot
+        # All tables are slices of one buffer that is kept between steps and only grows, so a step fills every
+        # column once for all units together
+        self.buffer = np.zeros(self.INITIAL_ROWS, dtype=UNIT_DTYPE)
+        for name in self.TABLES:
+            setattr(self, name, UnitTable(bot))
+        self.type_values = np.zeros(0, dtype=np.float32)  # unit type id -> mineral plus vespene cost
+        self._lookup = None
+
+    def update(self):
+        collections = [list(getattr(self.bot, name)) for name in self.TABLES]
+        units = [unit for collection in collections for unit in collection]
+        if len(units) > len(self.buffer):
+            self.buffer = np.zeros(max(len(units), 2 * len(self.buffer)), dtype=UNIT_DTYPE)
+        fill_rows(self.buffer[:len(units)], units)
+        start = 0
+        for name, collection in zip(self.TABLES, collections):
+            getattr(self, name).set(collection, self.buffer[start:start + len(collection)])
+            start += len(collection)
+        self._lookup = None
+
+    # Our units and structures of the given types, or only the finished ones
+    def own(self, types, ready=False):
+        selected = []
+        for type_id in types:
+            selected.extend(self.units.of_type(type_id, ready))
+            selected.extend(self.structures.of_type(type_id, ready))
+        return Units(selected, self.bot)
+
+    # Resource value of every row of the table; costs are looked up once per unit type
+    def values(self, table):
+        types = table.rows["type"]
+        if not len(types):
+            return np.zeros(0, dtype=np.float32)
+        if types.max() >= len(self.type_values):
+            values = np.full(int(types.max()) + 1, np.nan, dtype=np.float32)
+            values[:len(self.type_values)] = self.type_values
+            self.type_values = values
+        for type_id in np.unique(types[np.isnan(self.type_values[types])]).tolist():
+            cost = self.bot.game_data.units[type_id].cost
+            self.type_values[type_id] = cost.minerals + cost.vespene
+        return self.type_values[types]
+
+    # Rows of the given units of this step, from whichever table they are in; KeyError for any other unit, like
+    # resources or units of an earlier step
+    def rows_of(self, units):
+        if self._lookup is None:
+            rows = self.buffer[:sum(len(getattr(self, name)) for name in self.TABLES[:4])]
+            order = np.argsort(rows["tag"], kind="stable")
+            self._lookup = (rows["tag"][order], rows[order])
+        tags, rows = self._lookup
+        wanted = np.fromiter((unit.tag for unit in units), dtype=np.uint64, count=len(units))
+        index = np.searchsorted(tags, wanted)
+        found = index < len(tags)
+        found[found] = tags[index[found]] == wanted[found]
+        if not found.all():
+            raise KeyError(f"Not in this step's snapshot: {wanted[~found].tolist()}")
+        return rows[index]
@@ -0,0 +1,70 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from sc2.units import Units
+
+
+# KD-tree backed index over a Units collection, built once per step and queried by every manager. Positions can be
+# handed in when they are already known, e.g. from the step's snapshot
+class SpatialIndex:
+    def __init__(self, units, bot_object, positions=None):
+        self._bot_object = bot_object
+        self.units = units
+        self._unit_list = list(units)
+        if self._unit_list:
+            if positions is None:
+                positions = [unit.position_tuple for unit in self._unit_list]
+            self.positions = np.array(positions, dtype=float)
+            self._tree = cKDTree(self.positions)
+        else:
+            self.positions = np.empty((0, 2), dtype=float)
+            self._tree = None
+
+    def __len__(self):
+        return len(self._unit_list)
+
+    def unit_at(self, index):
+        return self._unit_list[index]
+
+    @staticmethod
+    def _to_xy(position):
+        # Accept Units, Points and plain (x, y) tuples like the python-sc2 Units helpers do
+        if hasattr(position, "position_tuple"):
+            return position.position_tuple
+        return position[0], position[1]
+
+    # Units within the given radius of a position (same contract as Units.closer_than)
+    def closer_than(self, distance, position):
+        if self._tree is None:
+            return Units([], self._bot_object)
+        indices = self._tree.query_ball_point(self._to_xy(position), distance)
+        return Units([self._unit_list[i] for i in sorted(indices)], self._bot_object)
+
+    # True if at least one unit is within the given radius of the position
+    def exists_within(self, distance, position):
+        if self._tree is None:
+            return False
+        nearest_distance, _ = self._tree.query(self._to_xy(position), k=1, distance_upper_bound=distance)
+        return nearest_distance <= distance
+
+    # Nearest unit to the position, or None if the index is empty
+    def closest_to(self, position):
+        if self._tree is None:
+            return None
+        _, index = self._tree.query(self._to_xy(position), k=1)
+        return self._unit_list[index]
+
+    # Distance to the nearest indexed unit for each of the given positions (inf where nothing is in range)
+    def nearest_distances(self, positions, distance_upper_bound=np.inf):
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        if self._tree is None or not len(positions):
+            return np.full(len(positions), np.inf)
+        distances, _ = self._tree.query(positions, k=1, distance_upper_bound=distance_upper_bound)
+        return distances
+
+    # Index of the first position that has an indexed unit within the radius, or None
+    def first_within(self, distance, positions):
+        hits = np.flatnonzero(self.nearest_distances(positions, distance) <= distance)
+        if hits.size:
+            return int(hits[0])
+        return None
@@ -0,0 +1,113 @@
+import numpy as np
+from scipy import ndimage
+
+from sc2.position import Point2
+from sc2.units import Units
+
+from unit_registry import ROLES
+
+
+class Squad:
+    def __init__(self, squad_id, units):
+        self.id = squad_id
+        self.units = units
+        self.tags = {unit.tag for unit in units}
+        self.center = units.center
+        self.leader = units.closest_to(self.center)  # Unit nearest the center, for support units to follow
+        self.strength = 0  # Resource value of the squad's units
+        # The last order the squad got, kept across steps: destination, route waypoint and whether to attack-move
+        self.target = None
+        self.waypoint = None
+        self.attacking = False
+
+
+# Clusters the army into squads every step so decisions and orders are made per squad instead of per unit. Units
+# are bucketed into a coarse grid and touching occupied buckets form a squad, a grid variant of DBSCAN. Squads keep
+# their id (and last order) across steps through the members they share with the squads of the previous step.
+class SquadManager:
+    CLUSTER_CELL = 6  # Side of a grid bucket; units in the same or neighbouring buckets share a squad
+    REISSUE_DISTANCE = 4  # How far the destination or the route waypoint has to move before a squad is ordered again
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.squads = []
+        self.squad_of = {}  # unit tag -> squad id
+        self.next_id = 0
+
+    def __iter__(self):
+        return iter(self.squads)
+
+    def __len__(self):
+        return len(self.squads)
+
+    def update(self):
+        table = self.bot.snapshot.units
+        in_army = table.mask(ROLES["army"])
+        if not in_army.any():
+            self.squads, self.squad_of = [], {}
+            return
+
+        army = table.select(in_army)
+        cells = (table.positions[in_army] // self.CLUSTER_CELL).astype(np.int64)
+        occupied = np.zeros(tuple(cells.max(axis=0)[::-1] + 1), dtype=bool)
+        occupied[cells[:, 1], cells[:, 0]] = True
+        labels, count = ndimage.label(occupied, structure=np.ones((3, 3)))
+        unit_labels = labels[cells[:, 1], cells[:, 0]] - 1
+        strengths = np.bincount(unit_labels, weights=self.bot.snapshot.values(table)[in_army], minlength=count)
+        members = [[] for _ in range(count)]
+        for unit, label in zip(army, unit_labels.tolist()):
+            members[label].append(unit)
+
+        # Largest clusters claim the id of the previous squad they share the most units with
+        previous = {squad.id: squad for squad in self.squads}
+        squads, taken = [], set()
+        for label in sorted(range(count), key=lambda label: len(members[label]), reverse=True):
+            units = members[label]
+            shared = {}
+            for unit in units:
+                squad_id = self.squad_of.get(unit.tag)
+                if squad_id is not None and squad_id not in taken:
+                    shared[squad_id] = shared.get(squad_id, 0) + 1
+            if shared:
+                squad_id = max(shared, key=shared.get)
+            else:
+                squad_id, self.next_id = self.next_id, self.next_id + 1
+            taken.add(squad_id)
+            squad = Squad(squad_id, Units(units, self.bot))
+            squad.strength = float(strengths[label])
+            if squad_id in previous:
+                last = previous[squad_id]
+                squad.target, squad.waypoint, squad.attacking = last.target, last.waypoint, last.attacking
+            squads.append(squad)
+        self.squads = squads
+        self.squad_of = {tag: squad.id for squad in squads for tag in squad.tags}
+
+    def is_current(self, squad, destination, waypoint, attack):
+        return (squad.target is not None and squad.attacking == attack
+                and squad.target.distance_to(destination) < self.REISSUE_DISTANCE
+                and squad.waypoint.distance_to(waypoint) < self.REISSUE_DISTANCE)
+
+    def closest_to(self, position):
+        return min(self.squads, key=lambda squad: squad.center.distance_to(position), default=None)
+
+    # Send every squad towards the destination along the ground route from its center; all units of a squad get the
+    # same order, which goes out as a single command. A squad already heading there is only re-ordered once its
+    # waypoint has moved on, otherwise just its idle units are. Units in skip keep the orders they already got this
+    # step
+    def order(self, destination, attack=False, avoid_threat=False, idle_only=False, skip=()):
+        if not self.squads:
+            return
+        destination = Point2(destination)
+        waypoints = self.bot.flow_fields.route([squad.center for squad in self.squads], destination, avoid_threat)
+        for squad, waypoint in zip(self.squads, waypoints):
+            current = self.is_current(squad, destination, waypoint, attack)
+            # Orders to idle units only leave the busy ones on their old order, so the squad's order is not updated
+            if not current and not idle_only:
+                squad.target, squad.waypoint, squad.attacking = destination, waypoint, attack
+            for unit in squad.units:
+                if ((idle_only or current) and not unit.is_idle) or unit.tag in skip:
+                    continue
+                if attack:
+                    unit.attack(waypoint)
+                else:
+                    unit.move(waypoint)
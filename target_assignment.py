@@ -0,0 +1,110 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.spatial.distance import cdist
+
+from sc2.ids.unit_typeid import UnitTypeId
+
+HEALABLE_TYPES = {UnitTypeId.MARINE, UnitTypeId.MARAUDER, UnitTypeId.REAPER, UnitTypeId.GHOST}
+# Unarmed units that still make the enemy army stronger and are worth shooting first
+SUPPORT_TYPES = {UnitTypeId.MEDIVAC, UnitTypeId.WARPPRISM, UnitTypeId.WARPPRISMPHASING, UnitTypeId.OBSERVER,
+                 UnitTypeId.OVERSEER, UnitTypeId.RAVEN, UnitTypeId.HIGHTEMPLAR, UnitTypeId.INFESTOR}
+
+
+# Assigns attack targets for a whole engagement at once from a distance and dps matrix of our units against the
+# enemies. Enemies are served in order of value per remaining hit point (tanks and medivacs come first), each
+# getting only as many attackers as it takes to kill it quickly so shots are not wasted on overkill.
+class TargetAssigner:
+    ENGAGE_MARGIN = 1.5  # Distance beyond weapon range a unit may close to reach its target
+    KILL_TIME = 1.0  # Seconds in which the attackers stacked on a target should be able to kill it
+    UNARMED_PRIORITY = 0.25  # Priority factor of enemies that can neither shoot nor support
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    # (our unit, enemy) pairs for every unit that can reach something to shoot at
+    def assign(self, units, enemies):
+        if not units or not enemies:
+            return []
+        sim = self.bot.combat_sim
+        our_rows = self.bot.snapshot.rows_of(units)
+        their_rows = self.bot.snapshot.rows_of(enemies)
+        our_stats = [sim.stats_for(unit) for unit in units]
+        their_stats = [sim.stats_for(enemy) for enemy in enemies]
+
+        # dps and range only depend on the pair of types, so they are worked out per pair and then spread out
+        our_kinds, our_index = self.kinds(our_stats)
+        their_kinds, their_index = self.kinds(their_stats)
+        pair_dps = np.array([[ours.dps_against(theirs) for theirs in their_kinds] for ours in our_kinds])
+        pair_range = np.array([[ours.range_against(theirs) for theirs in their_kinds] for ours in our_kinds])
+        dps = pair_dps[our_index][:, their_index]
+        reach = (pair_range[our_index][:, their_index] + self.ENGAGE_MARGIN
+                 + our_rows["radius"][:, None] + their_rows["radius"][None, :])
+        distance = cdist(our_rows["position"], their_rows["position"])
+        can_hit = (dps > 0) & (distance <= reach)
+
+        hp = their_rows["hp"].astype(float) + their_rows["shield"]
+        threat = np.array([1.0 if stats.ground or stats.air or enemy.type_id in SUPPORT_TYPES
+                           else self.UNARMED_PRIORITY for stats, enemy in zip(their_stats, enemies)])
+        priority = np.array([stats.value for stats in their_stats], dtype=float) * threat / np.maximum(hp, 1)
+
+        # Closest attackers first until their combined dps kills the target within KILL_TIME
+        assigned = np.full(len(units), -1)
+        for target in np.argsort(-priority, kind="stable"):
+            candidates = np.flatnonzero(can_hit[:, target] & (assigned < 0))
+            if not candidates.size:
+                continue
+            candidates = candidates[np.argsort(distance[candidates, target], kind="stable")]
+            enough = np.searchsorted(np.cumsum(dps[candidates, target]), hp[target] / self.KILL_TIME) + 1
+            assigned[candidates[:enough]] = target
+
+        # Units left over once every reachable target is covered pile onto the best target they can reach
+        spare = np.flatnonzero((assigned < 0) & can_hit.any(axis=1))
+        if spare.size:
+            assigned[spare] = np.argmax(np.where(can_hit[spare], priority, -np.inf), axis=1)
+        return [(units[i], enemies[j]) for i, j in enumerate(assigned.tolist()) if j >= 0]
+
+    @staticmethod
+    def kinds(stats):
+        index, kinds, positions = {}, [], []
+        for entry in stats:
+            if id(entry) not in index:
+                index[id(entry)] = len(kinds)
+                kinds.append(entry)
+            positions.append(index[id(entry)])
+        return kinds, np.array(positions)
+
+    # Order the assigned attacks; returns the tags of the units that got a target
+    def engage(self, units, enemies):
+        engaged = set()
+        for unit, target in self.assign(units, enemies):
+            unit.attack(target)
+            engaged.add(unit.tag)
+        return engaged
+
+    # (medivac, unit) pairs that send each medivac to a different injured bio unit, weighing distance against how
+    # badly the unit is hurt; medivacs beyond the number of injured units join the one closest to them
+    def pair_medivacs(self, medivacs, units):
+        if not medivacs or not units:
+            return []
+        unit_rows = self.bot.snapshot.rows_of(units)
+        healable = np.isin(unit_rows["type"], [type_id.value for type_id in HEALABLE_TYPES])
+        hurt = healable & (unit_rows["hp"] < unit_rows["hp_max"])
+        if not hurt.any():
+            return []
+        injured = [units[i] for i in np.flatnonzero(hurt)]
+        cost = cdist(self.bot.snapshot.rows_of(medivacs)["position"], unit_rows["position"][hurt])
+        cost *= (unit_rows["hp"][hurt] / unit_rows["hp_max"][hurt])[None, :]
+        paired_medivacs, paired_units = linear_sum_assignment(cost)
+        paired = dict(zip(paired_medivacs.tolist(), paired_units.tolist()))
+        for row in range(len(medivacs)):
+            if row not in paired:
+                paired[row] = int(np.argmin(cost[row]))
+        return [(medivacs[row], injured[column]) for row, column in paired.items()]
+
+    # Send medivacs to the injured; returns the tags of the medivacs that got someone to heal
+    def heal(self, medivacs, units):
+        healing = set()
+        for medivac, unit in self.pair_medivacs(medivacs, units):
+            medivac.move(unit)
+            healing.add(medivac.tag)
+        return healing
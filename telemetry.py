@@ -0,0 +1,208 @@
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from sc2.ids.unit_typeid import UnitTypeId
+
+# Unit types counted every step, in column order of the "counts" column
+TRACKED_TYPES = (
+    UnitTypeId.SCV, UnitTypeId.MARINE, UnitTypeId.MARAUDER, UnitTypeId.REAPER, UnitTypeId.SIEGETANK,
+    UnitTypeId.SIEGETANKSIEGED, UnitTypeId.MEDIVAC, UnitTypeId.BANSHEE, UnitTypeId.COMMANDCENTER,
+    UnitTypeId.ORBITALCOMMAND, UnitTypeId.PLANETARYFORTRESS, UnitTypeId.SUPPLYDEPOT, UnitTypeId.REFINERY,
+    UnitTypeId.BARRACKS, UnitTypeId.FACTORY, UnitTypeId.STARPORT, UnitTypeId.ENGINEERINGBAY, UnitTypeId.ARMORY,
+)
+# Army decisions taken during a step, in order of precedence when several are taken in the same step
+DECISIONS = ("none", "attack", "retreat", "defend", "fall_back")
+
+ROW_DTYPE = np.dtype([
+    ("game_loop", np.uint32),
+    ("step_ms", np.float32),
+    ("minerals", np.int32),
+    ("vespene", np.int32),
+    ("supply_used", np.uint16),
+    ("supply_cap", np.uint16),
+    ("workers", np.uint16),
+    ("townhalls", np.uint8),
+    ("squads", np.uint8),
+    ("army_value", np.float32),  # Resource value of our army
+    ("enemy_army_value", np.float32),  # Remembered enemy army value, discounted by how long ago it was seen
+    ("decision", np.uint8),  # Index into DECISIONS
+    ("counts", np.uint16, (len(TRACKED_TYPES),)),
+])
+
+
+# Per-step game telemetry for tuning the bot's thresholds over many games. Steps are written into a preallocated
+# ring of structured rows; every FLUSH_ROWS steps a copy of the filled part is handed to a writer thread that
+# appends it to one memory-mapped file per column, so the game loop never waits on the disk. Opt-in like the
+# profiler: without an output directory recording does nothing.
+class TelemetryRecorder:
+    RING_ROWS = 512
+    FLUSH_ROWS = 128  # Rows handed to the writer at once; divides RING_ROWS so every hand-off is one slice
+
+    def __init__(self, bot, output_dir=None):
+        self.bot = bot
+        self.output_dir = output_dir
+        self.enabled = output_dir is not None
+        self.ring = np.zeros(self.RING_ROWS, dtype=ROW_DTYPE)
+        self.rows = 0  # Rows recorded so far
+        self.flushed = 0  # Rows handed to the writer so far
+        self.decision = 0
+        self.path = None
+        self.chunks = queue.Queue()
+        self.writer = None
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=time.strftime("game-%Y%m%d-%H%M%S-"), dir=self.output_dir)
+        self.writer = ColumnWriter(self.path, ROW_DTYPE, self.chunks)
+        self.writer.start()
+
+    # Note an army decision for the current step; the highest ranked one of the step is recorded
+    def decide(self, decision):
+        if self.enabled:
+            self.decision = max(self.decision, DECISIONS.index(decision))
+
+    def record(self, step_time):
+        if not self.enabled:
+            return
+        if self.writer is None:
+            self.start()
+        bot = self.bot
+        row = self.ring[self.rows % self.RING_ROWS]
+        row["game_loop"] = bot.state.game_loop
+        row["step_ms"] = step_time * 1000
+        row["minerals"] = bot.minerals
+        row["vespene"] = bot.vespene
+        row["supply_used"] = bot.supply_used
+        row["supply_cap"] = bot.supply_cap
+        row["workers"] = bot.workers.amount
+        row["townhalls"] = bot.townhalls.amount
+        row["squads"] = len(bot.squads)
+        row["army_value"] = sum(squad.strength for squad in bot.squads)
+        row["enemy_army_value"] = bot.enemy_memory.army_value()
+        row["decision"] = self.decision
+        row["counts"] = [bot.registry.count(type_id) for type_id in TRACKED_TYPES]
+        self.decision = 0
+        self.rows += 1
+        if self.rows % self.FLUSH_ROWS == 0:
+            self.flush()
+
+    # Hand the rows recorded since the last hand-off to the writer
+    def flush(self):
+        first = self.flushed % self.RING_ROWS
+        self.chunks.put(self.ring[first:first + self.rows - self.flushed].copy())
+        self.flushed = self.rows
+
+    # Write what is left, wait for the writer and describe the game next to the columns
+    def close(self, result=None):
+        if self.writer is None:
+            return
+        if self.rows > self.flushed:
+            self.flush()
+        self.chunks.put(None)
+        self.writer.join()
+        bot = self.bot
+        meta = {
+            "rows": self.writer.rows,
+            "columns": {name: [ROW_DTYPE[name].base.str, list(ROW_DTYPE[name].shape)] for name in ROW_DTYPE.names},
+            "decisions": list(DECISIONS),
+            "unit_types": [type_id.name for type_id in TRACKED_TYPES],
+            "map": bot.game_info.map_name,
+            "enemy_race": bot.enemy_race.name,
+            "result": getattr(result, "name", result),
+        }
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        self.writer = None
+
+
+# Appends chunks of structured rows to one raw .bin file per column. Files grow by doubling and are written
+# through memory maps; the unused tail is cut off once the queue delivers None.
+class ColumnWriter(threading.Thread):
+    INITIAL_ROWS = 4096
+
+    def __init__(self, path, dtype, chunks):
+        super().__init__(daemon=True)
+        self.path = path
+        self.dtype = dtype
+        self.chunks = chunks
+        self.rows = 0
+        self.capacity = 0
+        self.columns = {}
+
+    def run(self):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                break
+            try:
+                self.append(chunk)
+            except OSError as e:
+                print(f"Telemetry writer stopped: {e}")
+                break
+        self.resize(self.rows)
+
+    def append(self, chunk):
+        if self.rows + len(chunk) > self.capacity:
+            self.resize(max(self.capacity * 2, self.INITIAL_ROWS, self.rows + len(chunk)))
+        for name in self.dtype.names:
+            self.columns[name][self.rows:self.rows + len(chunk)] = chunk[name]
+        self.rows += len(chunk)
+
+    def resize(self, capacity):
+        for name in self.dtype.names:
+            column = self.columns.pop(name, None)
+            if column is not None:
+                column.flush()
+                del column
+            field = self.dtype[name]
+            file_name = os.path.join(self.path, f"{name}.bin")
+            with open(file_name, "ab") as f:
+                f.truncate(capacity * field.itemsize)
+            if capacity:
+                self.columns[name] = np.memmap(file_name, dtype=field.base, mode="r+",
+                                               shape=(capacity,) + field.shape)
+        self.capacity = capacity
+
+
+# Columns of one recorded game as read-only memory maps, with its meta data
+def load_game(path, columns=None):
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    data = {}
+    for name in columns or meta["columns"]:
+        dtype, shape = meta["columns"][name]
+        shape = (meta["rows"],) + tuple(shape)
+        if meta["rows"]:
+            data[name] = np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype, mode="r", shape=shape)
+        else:
+            data[name] = np.zeros(shape, dtype=dtype)  # Zero length files cannot be memory-mapped
+    return meta, data
+
+
+# Every finished game under the directory; games without meta data are still running or crashed
+def load_games(root, columns=None):
+    for name in sorted(os.listdir(root)):
+        path = os.path.join(root, name)
+        if os.path.isfile(os.path.join(path, "meta.json")):
+            yield path, *load_game(path, columns)
+
+
+# The selected columns of all games concatenated, plus a "game" column indexing into the returned meta list.
+# Only the requested columns are read, so scanning thousands of games for a few columns stays cheap.
+def load_all(root, columns):
+    metas, parts = [], {name: [] for name in columns}
+    games = []
+    for index, (_, meta, data) in enumerate(load_games(root, columns)):
+        metas.append(meta)
+        games.append(np.full(meta["rows"], index, dtype=np.int32))
+        for name in columns:
+            parts[name].append(np.asarray(data[name]))
+    table = {name: np.concatenate(chunks) if chunks else np.empty(0) for name, chunks in parts.items()}
+    table["game"] = np.concatenate(games) if games else np.empty(0, dtype=np.int32)
+    return metas, table
@@ -0,0 +1,79 @@
+from collections import defaultdict
+
+from sc2.ids.unit_typeid import UnitTypeId
+
+ROLES = {
+    "army": {UnitTypeId.MARINE, UnitTypeId.MARAUDER, UnitTypeId.REAPER, UnitTypeId.SIEGETANK,
+             UnitTypeId.SIEGETANKSIEGED},
+    "support": {UnitTypeId.MEDIVAC},
+    "worker": {UnitTypeId.SCV, UnitTypeId.MULE},
+    "production": {UnitTypeId.BARRACKS, UnitTypeId.FACTORY, UnitTypeId.STARPORT},
+    "tech": {UnitTypeId.ENGINEERINGBAY, UnitTypeId.ARMORY, UnitTypeId.BARRACKSTECHLAB, UnitTypeId.FACTORYTECHLAB,
+             UnitTypeId.STARPORTTECHLAB, UnitTypeId.FUSIONCORE, UnitTypeId.GHOSTACADEMY},
+}
+
+
+# Our units and structures by type, maintained from unit events instead of filtering self.units on every question.
+# Counts are set sizes; Units views are selected from the step's snapshot once per step and type or role.
+class UnitRegistry:
+    def __init__(self, bot):
+        self.bot = bot
+        self.tags = defaultdict(set)  # type -> tags of our units of that type, including unfinished structures
+        self.ready_tags = defaultdict(set)  # type -> tags of the finished ones
+        self.types = {}  # tag -> type
+        self._views_loop = None
+        self._views = {}
+
+    def setup(self):
+        for unit in self.bot.all_own_units:
+            self.add(unit)
+
+    def add(self, unit):
+        self.remove(unit.tag)
+        self.types[unit.tag] = unit.type_id
+        self.tags[unit.type_id].add(unit.tag)
+        if unit.is_ready:
+            self.ready_tags[unit.type_id].add(unit.tag)
+
+    def complete(self, unit):
+        if unit.tag not in self.types:
+            self.add(unit)
+        self.ready_tags[self.types[unit.tag]].add(unit.tag)
+
+    def remove(self, tag):
+        type_id = self.types.pop(tag, None)
+        if type_id is not None:
+            self.tags[type_id].discard(tag)
+            self.ready_tags[type_id].discard(tag)
+
+    # Sieging, lowering depots, lifting off and morphs move the unit to its new type
+    def type_changed(self, unit):
+        self.add(unit)
+
+    def count(self, type_id, ready=False):
+        return len((self.ready_tags if ready else self.tags)[type_id])
+
+    # Existing plus in production or on the way to be built, like units(X).amount + already_pending(X)
+    def total(self, type_id):
+        return len(self.tags[type_id]) + self.bot.already_pending(type_id)
+
+    def units(self, type_id, ready=False):
+        return self._view(type_id, {type_id}, ready)
+
+    def ready(self, type_id):
+        return self.units(type_id, ready=True)
+
+    def role(self, name, ready=False):
+        return self._view(name, ROLES[name], ready)
+
+    # Views hold the Unit objects of one step, so they are dropped when a new step starts
+    def _view(self, name, types, ready):
+        game_loop = self.bot.state.game_loop
+        if self._views_loop != game_loop:
+            self._views_loop = game_loop
+            self._views = {}
+        key = (name, ready)
+        view = self._views.get(key)
+        if view is None:
+            view = self._views[key] = self.bot.snapshot.own(types, ready)
+        return view